@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import weakref
+
+from conversion import renderOutputs, writeOutputs
+from reader import DEFAULT_LIMITS, MusicXMLReader
+
+class ConversionCancelled(Exception):
+    """ raised in a worker thread whose lines are no longer consumed """
+
+def limitsForTimeout(limits, timeout):
+    """ return limits whose time budget ends the work itself by timeout,
+    since an executor cannot interrupt a conversion that has started """
+    limits = copy.copy(limits or DEFAULT_LIMITS)
+    if timeout is not None and (limits.time_budget is None or limits.time_budget > timeout):
+        limits.time_budget = timeout
+    return limits
+
+def convertSource(source, mode, tempo, keys=None, unfold=False, limits=None):
+    """ renderOutputs for a filename or the bytes of a score; runs in the executor """
+    if mode == 'lyrics':
+        from lyrics import renderLyrics
+        return renderLyrics(source, limits)
+    return renderOutputs(MusicXMLReader.open(source, limits), mode, tempo, keys, unfold)
+
+class _LineStream:
+    """ a text stream handing every complete line to put """
+
+    def __init__(self, put):
+        self._put = put
+        self._buffer = ''
+
+    def write(self, text):
+        lines = (self._buffer + text).split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            self._put(line)
+
+    def flush(self):
+        if self._buffer:
+            self._put(self._buffer)
+            self._buffer = ''
+
+def streamSource(source, mode, tempo, put, keys=None, unfold=False, limits=None):
+    """ call put with each line writeOutputs writes for source; runs in the executor """
+    stream = _LineStream(put)
+    writeOutputs(MusicXMLReader.open(source, limits), mode, tempo, stream, keys, unfold)
+    stream.flush()
+
+_DONE = object()
+
+def _callSoon(loop, callback):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError: # the loop was closed while the work ran
+        pass
+
+class AsyncConverter:
+    """ asyncio front end of the writers.
+
+    Parsing and rendering run in executor (a thread pool of max_in_flight
+    threads by default); at most max_in_flight conversions run at a time,
+    and a slot is only freed when the work itself ends, also after a
+    timeout or cancellation. A timeout also becomes the reader's time
+    budget, so abandoned work stops by itself.
+    """
+
+    def __init__(self, executor=None, max_in_flight=4, limits=None, queue_size=64):
+        self._own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=max_in_flight)
+        self.limits = limits
+        self.queue_size = queue_size # lines buffered ahead of an iterLines consumer
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def _run(self, timeout, function, *args):
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(lambda f: _callSoon(loop, self._semaphore.release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            future.cancel() # drops work that has not started yet
+            raise
+
+    async def convert(self, source, mode='jcx', tempo=0, keys=None, unfold=False, timeout=None):
+        """ return renderOutputs(...) for source, a filename or the bytes of a score """
+        return await self._run(timeout, convertSource, source, mode, tempo, keys, unfold,
+                               limitsForTimeout(self.limits, timeout))
+
+    async def iterLines(self, source, mode='jcx', tempo=0, keys=None, unfold=False, timeout=None):
+        """ yield the lines writeOutputs writes for source as they are rendered.
+
+        Lines are streamed from a thread executor; with another executor they
+        are yielded once the whole conversion is done.
+        """
+        limits = limitsForTimeout(self.limits, timeout)
+        if not isinstance(self.executor, ThreadPoolExecutor):
+            for suffix, content in await self.convert(source, mode, tempo, keys, unfold, timeout):
+                for line in content.split('\n'):
+                    yield line
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        queue = asyncio.Queue(self.queue_size)
+        closed = threading.Event()
+
+        def _put(line):
+            if closed.is_set():
+                raise ConversionCancelled()
+            asyncio.run_coroutine_threadsafe(queue.put(line), loop).result()
+
+        def _produce():
+            try:
+                streamSource(source, mode, tempo, _put, keys, unfold, limits)
+            finally:
+                if not closed.is_set():
+                    asyncio.run_coroutine_threadsafe(queue.put(_DONE), loop).result()
+
+        task = asyncio.ensure_future(self._run(None, _produce))
+        try:
+            while True:
+                remaining = deadline - loop.time() if deadline is not None else None
+                line = await asyncio.wait_for(queue.get(), remaining)
+                if line is _DONE:
+                    break
+                yield line
+            await task # raises what the conversion raised
+        finally:
+            closed.set()
+            while not queue.empty(): # unblock a producer waiting for room
+                queue.get_nowait()
+            if not task.done():
+                task.cancel()
+
+    def close(self):
+        if self._own_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+_CONVERTERS = weakref.WeakKeyDictionary() # event loop -> default AsyncConverter
+
+def getDefaultConverter():
+    """ the AsyncConverter used by convert() and iterLines() in the running loop """
+    loop = asyncio.get_running_loop()
+    converter = _CONVERTERS.get(loop)
+    if converter is None:
+        converter = _CONVERTERS[loop] = AsyncConverter()
+    return converter
+
+async def convert(source, mode='jcx', tempo=0, keys=None, unfold=False, timeout=None):
+    return await getDefaultConverter().convert(source, mode, tempo, keys, unfold, timeout)
+
+async def iterLines(source, mode='jcx', tempo=0, keys=None, unfold=False, timeout=None):
+    async for line in getDefaultConverter().iterLines(source, mode, tempo, keys, unfold, timeout):
+        yield line
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import tarfile
+import zipfile
+
+from conversion import iterOrdered, renderOutputs, writeOutputFiles
+from reader import DEFAULT_LIMITS, MusicXMLLimitError, MusicXMLReader
+
+logger = logging.getLogger(__name__)
+
+SCORE_EXTENSIONS = ('.musicxml', '.xml', '.mxl')
+
+def isScoreMember(name):
+    return name.lower().endswith(SCORE_EXTENSIONS) and not name.startswith('META-INF/')
+
+def isBundle(filename):
+    """ a tar archive, or a zip archive that is not itself an MXL container """
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            return 'META-INF/container.xml' not in archive.namelist()
+    return tarfile.is_tarfile(filename)
+
+def _readMember(limits, size, read):
+    """ return read(), or the MusicXMLLimitError of a member too large to read """
+    try:
+        limits.checkSize(size) # before decompressing, as readCompressedMusicXML does
+    except MusicXMLLimitError as e:
+        return e
+    return read()
+
+def _iterZipMembers(filename, limits):
+    with zipfile.ZipFile(filename) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and isScoreMember(info.filename):
+                yield info.filename, _readMember(limits, info.file_size, lambda: archive.read(info))
+
+def _iterTarMembers(filename, limits):
+    # stream mode reads the archive front to back without seeking
+    with tarfile.open(filename, mode='r|*') as archive:
+        for info in archive:
+            if info.isfile() and isScoreMember(info.name):
+                yield info.name, _readMember(limits, info.size, lambda: archive.extractfile(info).read())
+
+def iterBundleMembers(filename, limits=None):
+    """ yield (member name, content bytes) for each score in a tar or zip bundle;
+    MXL members are yielded as their compressed bytes. Members larger than
+    limits allow are not read; the MusicXMLLimitError is yielded instead """
+    limits = limits or DEFAULT_LIMITS
+    if zipfile.is_zipfile(filename):
+        return _iterZipMembers(filename, limits)
+    return _iterTarMembers(filename, limits)
+
+def iterBundleReaders(filename, limits=None):
+    """ yield (member name, MusicXMLReader) for each score in a bundle """
+    for name, data in iterBundleMembers(filename, limits):
+        if isinstance(data, MusicXMLLimitError):
+            raise data
+        yield name, MusicXMLReader.fromBytes(data, limits)
+
+def convertMember(name, data, mode, tempo, limits=None):
+    """ return a list of (filename suffix, content) for one bundle member """
+    if isinstance(data, MusicXMLLimitError): # not read, see iterBundleMembers
+        raise data
+    if mode == 'lyrics':
+        from lyrics import renderLyrics
+        return renderLyrics(data, limits)
+    return renderOutputs(MusicXMLReader.fromBytes(data, limits), mode, tempo)
+
+class BundleError(Exception):
+    pass
+
+def getOutputFilebase(output_dir, name):
+    """ the output path of a member, without extension, inside output_dir;
+    absolute names and names resolving outside output_dir are rejected """
+    normalized = os.path.normpath(name)
+    root = os.path.realpath(output_dir)
+    if not os.path.isabs(normalized):
+        filebase = os.path.realpath(os.path.join(root, os.path.splitext(normalized)[0]))
+        if os.path.commonpath([root, filebase]) == root and filebase != root:
+            return filebase
+    raise BundleError("member outside the output directory: %s" % name)
+
+def _writeOutputs(output_dir, name, outputs):
+    output_filebase = getOutputFilebase(output_dir, name)
+    os.makedirs(os.path.dirname(output_filebase), exist_ok=True)
+    return writeOutputFiles(output_filebase + os.path.splitext(name)[1], outputs)
+
+def convertBundle(filename, mode, tempo, output_dir, workers=1, limits=None):
+    """ convert every score of a bundle into output_dir, keeping member paths.
+
+    With workers > 1 members are rendered in a process pool; at most
+    2 * workers members are held in memory at a time. Members larger than
+    limits allow fail without being read. Return a list of
+    (member name, output filenames or the exception raised).
+    """
+    results = []
+    jobs = ((name, (name, data, mode, tempo, limits)) for name, data in iterBundleMembers(filename, limits))
+    for name, get_outputs in iterOrdered(convertMember, jobs, workers):
+        try:
+            results.append((name, _writeOutputs(output_dir, name, get_outputs())))
+        except Exception as e:
+            logger.error("%s: conversion failed: %s: %s", name, type(e).__name__, e)
+            results.append((name, e))
+    return results
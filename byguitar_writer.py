@@ -1,5 +1,6 @@
-from fractions import Fraction
 from writer import Jianpu99Writer
+from unfold import UnfoldedReader
+from timeline import formatDuration
 import re
 import lxml.html
 
@@ -14,6 +15,8 @@ def note2string(note):
 
 class ByguitarWriter(Jianpu99Writer):
 
+    RENDER_DEPENDENCIES = (formatDuration,) # see getSourceDigest
+
     STEP_TO_NUMBER = {
         'C': 'C',
         'D': 'D',
@@ -24,59 +27,38 @@ class ByguitarWriter(Jianpu99Writer):
         'B': 'B'
     }
 
-    def __init__(self, tempo):
+    def __init__(self, tempo, measure_cache=None, target_key=None, unfold=False, split_voices=False):
+        super().__init__(measure_cache, target_key, unfold)
         self.tempo_override = tempo
+        self.split_voices = split_voices
 
     def generateTimeSuffix(self, duration, divisions):
-        note_length = Fraction(duration, divisions)
-        return str(note_length)
-
-    def generateBasicNote(self, note):
-        #print( lxml.html.tostring(note._elem) )
-        (duration, divisions) = self.getNoteDisplayedDuration(note)
-        time_suffix = self.generateTimeSuffix(duration, divisions)
-        if note.isRest():
-            return "z" + time_suffix
-        else:
-            pitch = note.getPitch()
-            (note_name, octave) = note.getPitch()
-
-            keysig = note.getAttributes().getKeySignature()
-            if keysig != 'C':
-                offset = self.getTransposeOffsetToC(keysig)
-                (note_name, octave) = self.getTransposedPitch(note_name, octave, offset)
-
-            step = note_name[0:1] # C, D, E, F, G, A, B
-            accidental = note_name[1:2] # sharp (#) and flat (b)
-            if accidental == 'b':
-                accidental = '_' 
-            elif accidental == '#':
-                accidental = '^'
-
-            return accidental + self.stepToNumber(step) + self.generateOctaveMark(octave) + time_suffix
-
-    def generateNote(self, note):
-        result = self.generateBasicNote(note)
-        if note.isTieStart():
-            result = "(" + result
-        if note.isTupletStart():
-            result = "(3" + result
-        if note.isTupletStop():
-            #result = result + ")"
-            pass
-        if note.isTieStop():
-            if '-' in result: # put ending tie before the first -
-                idx = result.index('-')
-                result = result[:idx] + ") " + result[idx:]
-            else:
-                result = result + ")"
-        if note.isGrace():
-            #result = "{"+result+"}"
-            #print(note2string(note))
-            result = ''
-            pass
-        return result
+        return formatDuration(duration, divisions)
+
+    def emitTimeSuffix(self, duration, divisions, tokens):
+        tokens.append(self.generateTimeSuffix(duration, divisions))
+        return None # lengths are fractions; there are no extension tokens
+
+    REST = "z"
+    TUPLET_START = "(3"
+    TUPLET_STOP = ""
+    ACCIDENTALS = {'b': '_', '#': '^'}
+
+    def emitPitch(self, note, tokens):
+        (note_name, octave) = self.getRenderedPitch(note)
 
+        accidental = note_name[1:2] # sharp (#) and flat (b)
+        if accidental:
+            tokens.append(self.ACCIDENTALS[accidental])
+        tokens.append(self.stepToNumber(note_name[0:1])) # C, D, E, F, G, A, B
+        octave_mark = self.generateOctaveMark(octave)
+        if octave_mark:
+            tokens.append(octave_mark)
+
+    def emitSlice(self, notes, tokens):
+        if notes[0].isGrace(): # grace notes are not written
+            return
+        super().emitSlice(notes, tokens)
 
     def sanitizeLyrics(self, l):
         return re.sub("[’‘]", "'", l)
@@ -84,11 +66,11 @@ class ByguitarWriter(Jianpu99Writer):
     def generateLyricsMeasures(self, measureList):
         pieces = []
         for i, measure in enumerate(measureList):
-            for note in measure:
-                l = note.getLyric()
+            for notes in measure.getSlices(): # one syllable per slice
+                l = next(filter(None, (note.getLyric() for note in notes)), None)
                 if l:
                     pieces.append(self.sanitizeLyrics(l))
-                elif not note.isRest() and not note.isChord():
+                elif not notes[0].isRest():
                     pieces.append('*')
 
         pieces = list(filter(None, pieces))
@@ -96,84 +78,151 @@ class ByguitarWriter(Jianpu99Writer):
             return 'W: ' + ' '.join(pieces)
         return None
 
-    def generateMeasure(self, measure):
-        pieces = [self.generateNote(note) for note in measure if not note.isChord()]
-        return ' '.join(pieces)
-
-    def generateBody(self, reader, max_measures_per_line, target_part):
-        parts = reader.getPartIdList()
-        part_measures = dict()
-        for part in parts:
-            part_measures[part] = list(reader.iterMeasures(part))
-
-        # split staff
-        new_part_measures = {}
-        for part_id, measures in part_measures.items():
-            staffs = measures[0].getStaffs()
-            if len(staffs) > 1:
-                for staff_key in staffs.keys():
-                    new_part_id = f'{part_id}-{staff_key}'
-                    new_part_measures[new_part_id] = [m.cloneOnlyStaff((staff_key,)) for m in measures]
+    def getStaffParts(self, reader):
+        """ return a list of (part_id, staff_filter, voice_filter); parts spanning
+        several staffs are split into one entry per staff, and with split_voices
+        into one entry per (staff, voice) found in any of their measures """
+        staff_parts = []
+        for part_id in reader.getPartIdList():
+            first_measure = reader.getFirstMeasure(part_id)
+            voices = {} # (staff, voice) keys in order of appearance
+            if self.split_voices:
+                for measure in reader.iterMeasures(part_id):
+                    voices.update(dict.fromkeys(measure.getVoices()))
+            staffs = first_measure.getStaffs()
+            if len(voices) > 1:
+                staff_parts.extend((part_id, (staff_key,) if staff_key else None, voice)
+                                   for staff_key, voice in voices)
+            elif len(staffs) > 1:
+                staff_parts.extend((part_id, (staff_key,), None) for staff_key in staffs.keys())
             else:
-                new_part_measures[part_id] = measures
-
-        part_measures = new_part_measures
-
+                staff_parts.append((part_id, None, None))
+        return staff_parts
+
+    def iterLineChunks(self, reader, max_measures_per_line, target_part, release=False, staff_parts=None,
+                       line_range=None, prev_attributes=None):
+        """ yield the measures of each output line of target_part, or None for
+        every line when target_part does not exist. line_range=(first, stop)
+        limits the lines; prev_attributes then maps each part id to the
+        attributes in effect before the first line """
+        if staff_parts is None:
+            staff_parts = self.getStaffParts(reader)
+        if self.unfold:
+            reader = UnfoldedReader(reader)
+        measure_count = max(reader.getMeasureCount(part) for part in reader.getPartIdList())
+
+        start, stop = 0, measure_count
+        if line_range is not None:
+            start = line_range[0] * max_measures_per_line
+            stop = min(line_range[1] * max_measures_per_line, measure_count)
+
+        windows = None
+        staff_filter = voice_filter = None
+        if target_part < len(staff_parts):
+            part_id, staff_filter, voice_filter = staff_parts[target_part]
+            # a part split into several staffs or voices is walked once for each
+            release = release and [entry[0] for entry in staff_parts].count(part_id) == 1
+            windows = reader.iterMeasureWindows(part_id, max_measures_per_line, release, start, stop,
+                                                (prev_attributes or {}).get(part_id))
+
+        for i in range(start, stop, max_measures_per_line):
+            if windows is None:
+                yield None
+                continue
+            measures = next(windows, [])
+            if staff_filter or voice_filter is not None:
+                measures = [m.cloneOnlyStaff(staff_filter, voice_filter) for m in measures]
+            yield measures
+
+    def generateChunkLines(self, measures):
         lines = []
+        if measures is not None:
+            lines.append(self.generateMeasures(measures))
 
-        measure_count = max(len(measures) for measures in part_measures.values())
-        for i in range(0, measure_count, max_measures_per_line):
-            begin = i
-            end = min(i + max_measures_per_line, measure_count)
-            for part_index, part in enumerate(part_measures.keys()):
-                if part_index != target_part:
-                    continue
-                line = self.generateMeasures(part_measures[part][begin:end])
-                lines.append(line)
-
-                lyrics_line = self.generateLyricsMeasures(part_measures[part][begin:end])
-                if lyrics_line:
-                    lines.append(lyrics_line)
-                
-            lines.append('') # empty line
-
-        return '\n'.join(lines)
-    
-    def generate(self, reader, part_index):
-        return self.generateBody(reader, 2, part_index)
+            lyrics_line = self.generateLyricsMeasures(measures)
+            if lyrics_line:
+                lines.append(lyrics_line)
+
+        lines.append('') # empty line
+        return lines
 
+    def iterBodyLines(self, reader, max_measures_per_line, target_part, release=False, staff_parts=None):
+        """ yield body lines while holding only one line of measures """
+        for measures in self.iterLineChunks(reader, max_measures_per_line, target_part, release, staff_parts):
+            yield from self.generateChunkLines(measures)
 
-    def generate_jcx(self, reader):
+    def generateBody(self, reader, max_measures_per_line, target_part, release=False, staff_parts=None):
+        return '\n'.join(self.iterBodyLines(reader, max_measures_per_line, target_part, release, staff_parts))
+    
+    def generate(self, reader, part_index, release=False, staff_parts=None):
+        return self.generateBody(reader, 2, part_index, release, staff_parts)
+
+    def generateForKeys(self, reader, part_index, keys):
+        """ return {key: generate(reader, part_index) rendered in key}, walking the measures once """
+        writers = [self.withTargetKey(key) for key in keys]
+        outputs = [[] for key in keys]
+        for measures in self.iterLineChunks(reader, 2, part_index):
+            for writer, lines in zip(writers, outputs):
+                lines.extend(writer.generateChunkLines(measures))
+        return {key: '\n'.join(lines) for key, lines in zip(keys, outputs)}
+
+    def iter_jcx_header_lines(self, reader):
         def _getTempo():
             if self.tempo_override:
                 return self.tempo_override
             return reader.getInitialTempo()
 
-        parts_score = {}
         timesig = reader.getInitialTimeSignature()
         beats, beats_type = timesig.split('/')
-        lines = [
-            f'T: {reader.getWorkTitle()}',
-            f'K: {reader.getInitialKeySignature()}',
-            f'M: {beats}/{beats_type}',
-            f'L: 1/{beats_type}',
-            f'Q: 1/{beats_type}={_getTempo()}',
-        ]
-
-        parts = reader.getPartDetailsList()
-        for i, part in enumerate(parts):
-            lines.append(f'V:{part["id"]} name={part["name"]} style=jianpu ins=100 vol=100')
-            parts_score[part['id']] = self.generateBody(reader, 2, i)
-
-        lines.append('')
-        for k, score in parts_score.items():
-            lines.append(f'[V:{k}]')
-            lines.append(score)
-
-        return '\n'.join(lines)
-
-
-
-
-
-
+        yield f'T: {reader.getWorkTitle()}'
+        yield f'K: {self.target_key or reader.getInitialKeySignature()}'
+        yield f'M: {beats}/{beats_type}'
+        yield f'L: 1/{beats_type}'
+        yield f'Q: 1/{beats_type}={_getTempo()}'
+
+        for part in reader.getPartDetailsList():
+            yield f'V:{part["id"]} name={part["name"]} style=jianpu ins=100 vol=100'
+
+        yield ''
+
+    def iter_jcx_lines(self, reader, release=False):
+        """ yield the lines of generate_jcx, rendering one part at a time """
+        yield from self.iter_jcx_header_lines(reader)
+
+        staff_parts = self.getStaffParts(reader)
+        for i, part in enumerate(reader.getPartDetailsList()):
+            yield f'[V:{part["id"]}]'
+            empty = True
+            for line in self.iterBodyLines(reader, 2, i, release, staff_parts):
+                empty = False
+                yield line
+            if empty: # an empty body still takes a line
+                yield ''
+
+    def generate_jcx(self, reader, release=False):
+        return '\n'.join(self.iter_jcx_lines(reader, release))
+
+    def generate_jcx_for_keys(self, reader, keys):
+        """ return {key: generate_jcx(reader) rendered in key}, walking the measures once """
+        writers = [self.withTargetKey(key) for key in keys]
+        outputs = [list(writer.iter_jcx_header_lines(reader)) for writer in writers]
+
+        staff_parts = self.getStaffParts(reader)
+        for i, part in enumerate(reader.getPartDetailsList()):
+            for lines in outputs:
+                lines.append(f'[V:{part["id"]}]')
+            empty = True
+            for measures in self.iterLineChunks(reader, 2, i, staff_parts=staff_parts):
+                empty = False
+                for writer, lines in zip(writers, outputs):
+                    lines.extend(writer.generateChunkLines(measures))
+            if empty:
+                for lines in outputs:
+                    lines.append('')
+        return {key: '\n'.join(lines) for key, lines in zip(keys, outputs)}
+
+    def write_jcx(self, reader, stream, release=False):
+        self.writeLines(self.iter_jcx_lines(reader, release), stream)
+
+    def write(self, reader, part_index, stream, release=False, staff_parts=None):
+        self.writeLines(self.iterBodyLines(reader, 2, part_index, release, staff_parts), stream)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+
+from byguitar_writer import ByguitarWriter
+from conversion import iterOrdered, renderOutputs
+from reader import MusicXMLReader
+from unfold import UnfoldedReader
+from writer import Jianpu99Writer, getSourceDigest
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MODES = ('jcx', 'byguitar', 'jianpu99')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    render_key TEXT,
+    title TEXT,
+    composer TEXT,
+    key_signature TEXT,
+    time_signature TEXT,
+    tempo TEXT,
+    parts TEXT,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT NOT NULL REFERENCES scores(path) ON DELETE CASCADE,
+    mode TEXT NOT NULL,
+    name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (path, mode, name)
+);
+"""
+
+UPSERT_SCORE = """
+INSERT INTO scores (path, content_hash, render_key, title, composer, key_signature, time_signature, tempo, parts,
+                    updated)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(path) DO UPDATE SET
+    content_hash=excluded.content_hash, render_key=excluded.render_key,
+    title=excluded.title, composer=excluded.composer,
+    key_signature=excluded.key_signature, time_signature=excluded.time_signature,
+    tempo=excluded.tempo, parts=excluded.parts, updated=excluded.updated
+"""
+
+def openCatalog(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(scores)")}
+    if 'render_key' not in columns: # catalog written before render keys were stored
+        connection.execute("ALTER TABLE scores ADD COLUMN render_key TEXT")
+    return connection
+
+def getRenderKey(modes, tempo):
+    """ hash of what the stored rows depend on besides the file content:
+    the modes, the tempo, and the source of the code producing them """
+    source_digest = getSourceDigest(renderRecord, renderOutputs, MusicXMLReader, UnfoldedReader,
+                                    ByguitarWriter, Jianpu99Writer)
+    render_params = [list(modes), str(tempo), source_digest]
+    return hashlib.sha1(json.dumps(render_params).encode('utf-8')).hexdigest()
+
+def _getInitialTempo(reader):
+    try:
+        return reader.getInitialTempo()
+    except (AttributeError, KeyError): # no direction/sound in the first measure, or one without tempo
+        return None
+
+def renderRecord(path, data, content_hash, render_key, modes, tempo):
+    """ return (score row, output rows) for one file's content """
+    reader = MusicXMLReader.fromBytes(data)
+    score_row = (path, content_hash, render_key,
+                 reader.getWorkTitle(), reader.getComposer(),
+                 reader.getInitialKeySignature(), reader.getInitialTimeSignature(),
+                 _getInitialTempo(reader), json.dumps(reader.getPartDetailsList(), ensure_ascii=False),
+                 time.time())
+    output_rows = [(path, mode, suffix, content)
+                   for mode in modes
+                   for suffix, content in renderOutputs(reader, mode, tempo)]
+    return score_row, output_rows
+
+def _flush(connection, batch):
+    with connection: # one transaction per batch
+        connection.executemany(UPSERT_SCORE, [score_row for score_row, output_rows in batch])
+        connection.executemany("DELETE FROM outputs WHERE path = ?",
+                               [(score_row[0],) for score_row, output_rows in batch])
+        connection.executemany("INSERT INTO outputs (path, mode, name, content) VALUES (?, ?, ?, ?)",
+                               [row for score_row, output_rows in batch for row in output_rows])
+    batch.clear()
+
+def exportCatalog(filenames, db_path, modes=CATALOG_MODES, tempo=0, batch_size=500, workers=1):
+    """ convert filenames and store their metadata and outputs in a SQLite catalog.
+
+    Files whose content hash and render key (see getRenderKey) match the
+    catalog are skipped. Rows are written
+    in transactions of batch_size files; with workers > 1 rendering happens in
+    a process pool. Return counts of converted, skipped and failed files.
+    """
+    stats = {'converted': 0, 'skipped': 0, 'failed': 0}
+    connection = openCatalog(db_path)
+    render_key = getRenderKey(modes, tempo)
+    known_keys = {path: (content_hash, known_render_key) for path, content_hash, known_render_key
+                  in connection.execute("SELECT path, content_hash, render_key FROM scores")}
+    batch = []
+
+    def _changedFiles():
+        for path in filenames:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                logger.error("%s: cannot read: %s", path, e)
+                stats['failed'] += 1
+                continue
+            content_hash = hashlib.sha1(data).hexdigest()
+            if known_keys.get(path) == (content_hash, render_key):
+                stats['skipped'] += 1
+                continue
+            yield path, (path, data, content_hash, render_key, modes, tempo)
+
+    try:
+        for path, get_record in iterOrdered(renderRecord, _changedFiles(), workers):
+            try:
+                batch.append(get_record())
+            except Exception as e:
+                logger.error("%s: conversion failed: %s: %s", path, type(e).__name__, e)
+                stats['failed'] += 1
+                continue
+            stats['converted'] += 1
+            if len(batch) >= batch_size:
+                _flush(connection, batch)
+        _flush(connection, batch)
+    finally:
+        connection.close()
+    return stats
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ProcessPoolExecutor
+import collections
+import functools
+import os
+import sys
+
+from reader import MusicXMLReader, LazyMusicXMLReader
+from writer import Jianpu99Writer, WriterError
+from byguitar_writer import ByguitarWriter
+
+def _byguitarPartIndexes(writer, reader, part_index=None):
+    if part_index is not None:
+        return [part_index]
+    if writer.split_voices:
+        return range(0, len(writer.getStaffParts(reader)))
+    return range(0, len(reader.getPartIdList()))
+
+def renderOutputs(reader, mode, tempo, keys=None, unfold=False, split_voices=False, part_index=None,
+                  measure_cache=None, release=False):
+    """ return a list of (filename suffix, content) for the given output mode;
+    with keys, every output is rendered once per key from a single pass.
+
+    release=True frees the measures of the tree as they are rendered, for a
+    reader used by this render only; the reader cannot be used afterwards.
+    Peak memory is still that of the whole parsed tree.
+    """
+    if mode == 'jcx':
+        writer = ByguitarWriter(tempo, measure_cache, unfold=unfold, split_voices=split_voices)
+        if keys:
+            return [(f"-{key}.jcx", d) for key, d in writer.generate_jcx_for_keys(reader, keys).items()]
+        return [('.jcx', writer.generate_jcx(reader, release))]
+    elif mode == 'byguitar':
+        writer = ByguitarWriter(tempo, measure_cache, unfold=unfold, split_voices=split_voices)
+        part_indexes = _byguitarPartIndexes(writer, reader, part_index)
+        if keys:
+            return [(f"-{key}-{i}.txt", d)
+                    for i in part_indexes
+                    for key, d in writer.generateForKeys(reader, i, keys).items()]
+        staff_parts = writer.getStaffParts(reader) # read before any part is released
+        return [(f"-{i}.txt", writer.generate(reader, i, release, staff_parts)) for i in part_indexes]
+    elif mode == 'jianpu99':
+        writer = Jianpu99Writer(measure_cache, unfold=unfold)
+        if keys:
+            return [(f"-{key}.txt", d) for key, d in writer.generateForKeys(reader, keys).items()]
+        return [('.txt', writer.generate(reader, release))]
+    else:
+        raise WriterError("unrecognized mode: %s" % mode)
+
+def readInput(input_file, lazy=False):
+    """ open input_file ('-' for stdin); a lazy reader parses parts only when used """
+    reader_class = LazyMusicXMLReader if lazy else MusicXMLReader
+    if input_file == '-':
+        return reader_class.fromFile(sys.stdin.buffer)
+    return reader_class(input_file)
+
+def writeOutputs(reader, mode, tempo, stream, keys=None, unfold=False, split_voices=False, part_index=None,
+                 measure_cache=None, release=False):
+    """ stream the output of the given mode into a text stream; each output
+    ends with a newline. release is as for renderOutputs """
+    if keys:
+        for suffix, d in renderOutputs(reader, mode, tempo, keys, unfold, split_voices, part_index, measure_cache):
+            stream.write(d)
+            stream.write('\n')
+    elif mode == 'jcx':
+        writer = ByguitarWriter(tempo, measure_cache, unfold=unfold, split_voices=split_voices)
+        writer.write_jcx(reader, stream, release)
+        stream.write('\n')
+    elif mode == 'byguitar':
+        writer = ByguitarWriter(tempo, measure_cache, unfold=unfold, split_voices=split_voices)
+        staff_parts = writer.getStaffParts(reader) # read before any part is released
+        for i in _byguitarPartIndexes(writer, reader, part_index):
+            writer.write(reader, i, stream, release, staff_parts)
+            stream.write('\n')
+    elif mode == 'jianpu99':
+        Jianpu99Writer(measure_cache, unfold=unfold).write(reader, stream, release)
+        stream.write('\n')
+    else:
+        raise WriterError("unrecognized mode: %s" % mode)
+
+def writeOutputFiles(input_file, outputs):
+    """ write a list of (filename suffix, content) next to input_file; return the output filenames """
+    output_filebase, ext = os.path.splitext(input_file)
+    output_filenames = []
+    for suffix, d in outputs:
+        output_filename = output_filebase + suffix
+        with open(output_filename, 'w') as f:
+            f.write(d)
+        output_filenames.append(output_filename)
+    return output_filenames
+
+def iterSubmitted(executor, function, jobs, depth):
+    """ yield (key, future of function(*args)) for each (key, args) of jobs in
+    order, submitting to executor ahead of the consumer so that up to depth
+    jobs are running or done but not yet yielded """
+    in_flight = collections.deque()
+    for key, args in jobs:
+        in_flight.append((key, executor.submit(function, *args)))
+        if len(in_flight) >= depth:
+            yield in_flight.popleft()
+    while in_flight:
+        yield in_flight.popleft()
+
+def iterOrdered(function, jobs, workers=1):
+    """ yield (key, get_result) for each (key, args) of jobs in order, where
+    get_result() returns function(*args) or raises what it raised. With
+    workers > 1 the calls run in a process pool, at most 2 * workers of them
+    ahead of the consumer """
+    if workers <= 1:
+        for key, args in jobs:
+            yield key, functools.partial(function, *args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for key, future in iterSubmitted(executor, function, jobs, 2 * workers):
+            yield key, future.result
@@ -6,37 +6,184 @@ import os.path
 from reader import MusicXMLReader, MusicXMLParseError
 from writer import Jianpu99Writer, WriterError
 from byguitar_writer import ByguitarWriter
+from conversion import readInput, renderOutputs, writeOutputFiles, writeOutputs
+from metrics import ConversionMetrics, recordFile
 
 def parseArguments():
     parser = argparse.ArgumentParser()
-    parser.add_argument('input_file', help="input file in MusicXML format")
-    parser.add_argument('-m', '--mode', choices=('jianpu99', 'byguitar', 'jcx'), default='jcx', help="output format")
+    parser.add_argument('input_files', nargs='+', metavar='input_file', help="input file in MusicXML format ('-' for stdin), or a directory in watch mode")
+    parser.add_argument('-m', '--mode', choices=('jianpu99', 'byguitar', 'jcx', 'lyrics'), default='jcx', help="output format; lyrics writes the plain lyrics of every part")
     parser.add_argument('-t', '--tempo', default=0, help="tempo override")
+    parser.add_argument('-k', '--keys', type=lambda s: s.split(','), help="comma separated target keys, e.g. C,G,Bb; one output per key")
+    parser.add_argument('-u', '--unfold', action='store_true', help="write repeats, endings and D.C./D.S. jumps out in playback order")
+    parser.add_argument('-p', '--part', type=int, help="in byguitar mode, write only the part with this index, parsing no other part")
+    parser.add_argument('--split-voices', action='store_true', help="in byguitar and jcx mode, write every voice of a multi-voice part as its own part")
+    parser.add_argument('-w', '--watch', action='store_true', help="watch input_file as a directory and convert files as they change")
+    parser.add_argument('-b', '--bundle', action='store_true', help="convert every score in input_file, a tar or zip archive")
+    parser.add_argument('-o', '--output-dir', help="output directory in bundle mode (default: archive name without extension)")
+    parser.add_argument('--shard', action='store_true', help="render each byguitar/jianpu99 output in measure ranges across --workers processes")
+    parser.add_argument('--pipeline', action='store_true', help="read and unpack upcoming input files on --workers threads and write outputs in the background while converting")
+    parser.add_argument('--queue-depth', type=int, default=8, help="input files read ahead, and outputs waiting to be written, in pipeline mode")
+    parser.add_argument('--stdout', action='store_true', help="write byguitar and jianpu99 output to stdout instead of files")
+    parser.add_argument('--preflight', action='store_true', help="print a JSON line profiling each input file and its known issues instead of converting")
+    parser.add_argument('--measure-cache', metavar='DATABASE', help="reuse rendered measures across files and runs through a SQLite database")
+    parser.add_argument('--measure-cache-size', type=int, default=1000000, help="measures kept in the --measure-cache database, least recently used evicted first")
+    parser.add_argument('--metrics', metavar='PATH', help="record per-file latency, sizes, counts, errors and peak RSS into PATH")
+    parser.add_argument('--metrics-format', choices=ConversionMetrics.FORMATS, default='prometheus', help="prometheus rewrites PATH in the text exposition format; jsonl appends a line per file and a summary line")
+    parser.add_argument('--songbook', metavar='OUTPUT', help="write the input files, in order, as the songs of one jcx or jianpu99 document ('-' for stdout), rendered on --workers processes")
+    parser.add_argument('--catalog', metavar='DATABASE', help="store metadata and all outputs of the input files in a SQLite database")
+    parser.add_argument('--debounce', type=float, default=1.0, help="seconds a file must be unchanged before it is converted in watch mode")
+    parser.add_argument('--workers', type=int, default=2, help="number of concurrent conversions in watch, bundle and catalog mode")
     return parser.parse_args()
 
+def renderOutputsSharded(input_file, mode, tempo, workers):
+    """ renderOutputs for byguitar and jianpu99, splitting every part into
+    measure ranges rendered in a process pool """
+    from sharding import generateBodySharded
+    reader = MusicXMLReader(input_file)
+    if mode == 'byguitar':
+        writer = ByguitarWriter(tempo)
+        staff_parts = writer.getStaffParts(reader)
+        return [(f"-{i}.txt", generateBodySharded(reader, writer, 2, i, False, staff_parts, workers=workers))
+                for i in range(0, len(reader.getPartIdList()))]
+    elif mode == 'jianpu99':
+        return [('.txt', generateBodySharded(reader, Jianpu99Writer(), 5, workers=workers))]
+    else:
+        raise WriterError("mode cannot be sharded: %s" % mode)
+
+def renderInput(input_file, mode, tempo, keys=None, unfold=False, split_voices=False, part_index=None,
+                measure_cache=None, record=None, stream=None):
+    """ read input_file for a single render, freeing its measures as they are
+    rendered, and return renderOutputs(...); with stream, write the outputs
+    into it as writeOutputs does. A lazy reader (with part_index) holds one
+    part and is not released, so its notes are counted after the render """
+    record = record or recordFile(None, None)
+    lazy = part_index is not None
+    with record.phase('parse'):
+        reader = readInput(input_file, lazy)
+    if not lazy:
+        record.countReader(reader) # released measures have no notes left to count
+    with record.phase('render'):
+        if stream is None:
+            outputs = renderOutputs(reader, mode, tempo, keys, unfold, split_voices, part_index, measure_cache,
+                                    release=not lazy)
+        else:
+            outputs = writeOutputs(reader, mode, tempo, stream, keys, unfold, split_voices, part_index,
+                                   measure_cache, release=not lazy)
+    if lazy:
+        record.countReader(reader)
+    return outputs
+
+def convertFile(input_file, mode, tempo, keys=None, unfold=False, shard_workers=0, split_voices=False,
+                part_index=None, measure_cache=None, metrics=None):
+    """ convert input_file and write the outputs next to it; return the output filenames.
+    With metrics, a ConversionMetrics, the conversion is recorded in it """
+    with recordFile(metrics, input_file) as record:
+        if mode == 'lyrics':
+            from lyrics import renderLyrics
+            with record.phase('render'):
+                outputs = renderLyrics(input_file)
+        elif (shard_workers and not keys and not unfold and not split_voices and part_index is None
+                and mode in ('byguitar', 'jianpu99')):
+            with record.phase('render'):
+                outputs = renderOutputsSharded(input_file, mode, tempo, shard_workers)
+        else:
+            outputs = renderInput(input_file, mode, tempo, keys, unfold, split_voices, part_index, measure_cache,
+                                  record)
+        for suffix, d in outputs:
+            record.countOutput(d)
+        return writeOutputFiles(input_file, outputs)
+
 
 if __name__ == "__main__":
     args = parseArguments()
-    output_filebase, ext = os.path.splitext(args.input_file)
-
-    reader = MusicXMLReader(args.input_file)
-    if args.mode == 'jcx':
-        writer = ByguitarWriter(args.tempo)
-        print(writer.generate_jcx(reader))
-    elif args.mode == 'byguitar':
-        writer = ByguitarWriter(args.tempo)
-        parts = reader.getPartIdList()
-        for i in range(0, len(parts)):
-            output_filename = f"{output_filebase}-{i}.txt"
-            d = writer.generate(reader, i)
-            with open(output_filename, 'w') as f:
-                f.write(d)
-    elif args.mode == 'jianpu99':
-        output_filename = f"{output_filebase}.txt"
-        writer = Jianpu99Writer()
-        d = writer.generate(reader)
-        with open(output_filename, 'w') as f:
-            f.write(d)
-    else:
-        print("unrecognized mode:", args.mode)
+    metrics = None
+    if args.metrics:
+        import atexit
+        metrics = ConversionMetrics(args.metrics, args.metrics_format)
+        atexit.register(metrics.close) # also written when a conversion fails
+
+    if args.watch:
+        import logging
+        from watcher import DirectoryWatcher
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
 
+        def convert(path):
+            try:
+                return convertFile(path, args.mode, args.tempo, args.keys, args.unfold, metrics=metrics)
+            finally:
+                if metrics is not None:
+                    metrics.write()
+
+        watcher = DirectoryWatcher(args.input_files[0], convert, debounce=args.debounce, workers=args.workers)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+    elif args.preflight:
+        import json
+        from preflight import preflight
+        for input_file in args.input_files:
+            data = sys.stdin.buffer.read() if input_file == '-' else input_file
+            print(json.dumps(dict(preflight(data), file=input_file), ensure_ascii=False))
+    elif args.songbook:
+        from songbook import writeSongbook
+        if args.songbook == '-':
+            failed = writeSongbook(args.input_files, args.mode, args.tempo, sys.stdout, args.workers, args.unfold)
+        else:
+            with open(args.songbook, 'w') as f:
+                failed = writeSongbook(args.input_files, args.mode, args.tempo, f, args.workers, args.unfold)
+        for input_file, e in failed:
+            print("failed:", input_file, file=sys.stderr)
+        if failed:
+            sys.exit(1)
+    elif args.catalog:
+        from catalog import exportCatalog
+        stats = exportCatalog(args.input_files, args.catalog, tempo=args.tempo, workers=args.workers)
+        print("%(converted)d converted, %(skipped)d unchanged, %(failed)d failed" % stats, file=sys.stderr)
+    elif args.bundle:
+        from bundle import convertBundle
+        failed = []
+        for input_file in args.input_files:
+            output_dir = args.output_dir or os.path.splitext(input_file)[0]
+            results = convertBundle(input_file, args.mode, args.tempo, output_dir, args.workers)
+            failed += [name for name, outputs in results if isinstance(outputs, Exception)]
+        for name in failed:
+            print("failed:", name, file=sys.stderr)
+        if failed:
+            sys.exit(1)
+    else:
+        measure_cache = None
+        if args.measure_cache:
+            from measure_store import PersistentMeasureCache
+            measure_cache = PersistentMeasureCache(args.measure_cache, args.measure_cache_size)
+        if args.pipeline:
+            from pipeline import convertPipelined
+            results = convertPipelined(args.input_files, args.mode, args.tempo, args.keys, args.unfold,
+                                       args.split_voices, args.part, measure_cache, metrics,
+                                       prefetch_workers=args.workers, queue_depth=args.queue_depth)
+            failed = [input_file for input_file, outputs in results if isinstance(outputs, Exception)]
+            for input_file in failed:
+                print("failed:", input_file, file=sys.stderr)
+        else:
+            for input_file in args.input_files:
+                if args.mode == 'lyrics' and (args.stdout or input_file == '-'):
+                    from lyrics import renderLyrics
+                    with recordFile(metrics, input_file) as record, record.phase('render'):
+                        for suffix, d in renderLyrics(sys.stdin.buffer.read() if input_file == '-' else input_file):
+                            sys.stdout.write(d)
+                            sys.stdout.write('\n')
+                elif args.mode == 'jcx' or args.stdout or input_file == '-':
+                    with recordFile(metrics, input_file) as record:
+                        renderInput(input_file, args.mode, args.tempo, args.keys, args.unfold, args.split_voices,
+                                    args.part, measure_cache, record, sys.stdout)
+                else:
+                    convertFile(input_file, args.mode, args.tempo, args.keys, args.unfold,
+                                args.workers if args.shard else 0, args.split_voices, args.part, measure_cache,
+                                metrics)
+        if measure_cache is not None:
+            measure_cache.close()
+            print("measure cache: %(hits)d hits (%(store_hits)d stored), %(misses)d misses, "
+                  "%(evictions)d evicted" % measure_cache.getStats(), file=sys.stderr)
+        if args.pipeline and failed:
+            sys.exit(1)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+from reader import iterparseScore, releaseElement
+
+LYRICS_TAGS = ('part', 'measure', 'note')
+
+def getSyllable(lyric):
+    """ the text of a <lyric>, with a trailing - when the word continues, as Note.getLyric """
+    text = lyric.findtext('text')
+    if text is None:
+        return None
+    if lyric.findtext('syllabic') in ('begin', 'middle'):
+        text += '-'
+    return text
+
+def iterSyllables(source, limits=None, part_ids=None):
+    """ yield (part id, staff, verse, syllable) for every lyric in source, a
+    filename or bytes, from an incremental parse that only looks at notes.
+    Every part id met is appended to part_ids when given """
+    part_id = None
+    for event, elem in iterparseScore(source, LYRICS_TAGS, ('start', 'end'), limits):
+        if event == 'start':
+            if elem.tag == 'part':
+                part_id = elem.get('id')
+                if part_ids is not None:
+                    part_ids.append(part_id)
+            continue
+        if elem.tag == 'note':
+            staff = elem.findtext('staff')
+            for lyric in elem.iterchildren('lyric'):
+                syllable = getSyllable(lyric)
+                if syllable:
+                    yield part_id, staff, lyric.get('number', '1'), syllable
+        else: # measure or part
+            releaseElement(elem)
+
+def joinSyllables(syllables):
+    """ join syllables into words; a syllable ending in - runs into the next """
+    pieces = []
+    for syllable in syllables:
+        pieces.append(syllable)
+        if not syllable.endswith('-'):
+            pieces.append(' ')
+    return ''.join(pieces).strip()
+
+def extractLyrics(source, limits=None):
+    """ return {part id: {(staff, verse): text}} for every part, in order of appearance """
+    part_ids = []
+    syllables = {}
+    for part_id, staff, verse, syllable in iterSyllables(source, limits, part_ids):
+        syllables.setdefault(part_id, {}).setdefault((staff, verse), []).append(syllable)
+    return {part_id: {line: joinSyllables(line_syllables)
+                      for line, line_syllables in syllables.get(part_id, {}).items()}
+            for part_id in part_ids}
+
+def renderLyrics(source, limits=None):
+    """ return a list of (filename suffix, content) with the lyrics of every
+    part, one line per staff and verse """
+    return [(f"-{i}.lyrics.txt", '\n'.join(lines.values()))
+            for i, lines in enumerate(extractLyrics(source, limits).values())]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import sqlite3
+
+from writer import MeasureCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measures (
+    digest TEXT PRIMARY KEY,
+    tokens TEXT NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS measures_last_used ON measures (last_used);
+"""
+
+def getDigest(key):
+    """ canonical hash of a measure cache key: the writer, its render version,
+    the digest of its source, its target key, and the measure fingerprint
+    (notes, key and divisions) """
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+class PersistentMeasureCache(MeasureCache):
+    """ a MeasureCache backed by a SQLite file, shared by every file and run.
+
+    Rendered measures are stored under getDigest(key). Keys hold a digest
+    of the source of the writer and measure classes and of their render
+    dependencies (see writer.getSourceDigest), so after any change to
+    that code, or a bump of RENDER_VERSION, every measure of the writer is
+    rendered again instead of reused stale. The store keeps at most max_entries measures, evicting
+    the least recently used. New rows and use times are written in batches
+    of flush_every; hits counts memory and store hits, store_hits the latter.
+    Like MeasureCache it may be shared by writers on several threads.
+    """
+
+    def __init__(self, db_path, max_entries=1000000, flush_every=1000, memory_entries=10000):
+        super().__init__()
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.memory_entries = memory_entries
+        self.store_hits = 0
+        self.evictions = 0
+        self._connection = sqlite3.connect(db_path, check_same_thread=False) # used under self._lock
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._clock = self._connection.execute("SELECT COALESCE(MAX(last_used), 0) FROM measures").fetchone()[0]
+        self._new_rows = {} # digest -> tokens
+        self._used = {} # digest -> last_used
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def get(self, key, render):
+        digest = getDigest(key)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+            row = self._connection.execute("SELECT tokens FROM measures WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                self.store_hits += 1
+                return self._remember(key, digest, tuple(json.loads(row[0])))
+
+        result = render()
+        with self._lock:
+            self.misses += 1
+            self._new_rows.setdefault(digest, result)
+            return self._remember(key, digest, result)
+
+    def _remember(self, key, digest, result):
+        self._used[digest] = self._tick()
+        if len(self._entries) >= self.memory_entries:
+            self._entries.clear()
+        result = self._entries.setdefault(key, result)
+        if len(self._used) >= self.flush_every:
+            self._flush()
+        return result
+
+    def flush(self):
+        """ write pending measures and use times, then evict past max_entries """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        with self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO measures (digest, tokens, last_used) VALUES (?, ?, ?)",
+                                         [(digest, json.dumps(tokens, ensure_ascii=False), self._used[digest])
+                                          for digest, tokens in self._new_rows.items()])
+            self._connection.executemany("UPDATE measures SET last_used = ? WHERE digest = ?",
+                                         [(last_used, digest) for digest, last_used in self._used.items()
+                                          if digest not in self._new_rows])
+            count = self._connection.execute("SELECT COUNT(*) FROM measures").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._connection.execute("DELETE FROM measures WHERE digest IN "
+                                         "(SELECT digest FROM measures ORDER BY last_used LIMIT ?)", (excess,))
+                self.evictions += excess
+        self._new_rows.clear()
+        self._used.clear()
+
+    def getStats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'store_hits': self.store_hits,
+                'evictions': self.evictions, 'hit_rate': self.getHitRate()}
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self.store_hits = 0
+            self.evictions = 0
+            self._new_rows.clear()
+            self._used.clear()
+            with self._connection:
+                self._connection.execute("DELETE FROM measures")
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
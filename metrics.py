@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10)) # 1KB to 256MB
+
+def getPeakRSS():
+    """ peak resident set size of this process in bytes, None when unknown """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes on Linux
+
+class Histogram:
+    """ cumulative bucket counts of observed values, as a Prometheus histogram """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # the last bucket is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """ estimate the q quantile by interpolating within its bucket, as
+        Prometheus histogram_quantile does; None without observations """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets): # +Inf: the highest finite bound
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def iterCumulative(self):
+        """ yield (upper bound label, cumulative count) """
+        total = 0
+        for bound, count in zip(self.buckets + (None,), self.counts):
+            total += count
+            yield ('+Inf' if bound is None else repr(float(bound))), total
+
+class FileRecord:
+    """ what one conversion took: phase latencies, sizes and counts.
+
+    Used as a context manager around the conversion; on exit the record is
+    added to its ConversionMetrics, with the type of the exception raised if
+    any. A record without metrics only times phases.
+    """
+
+    def __init__(self, metrics, path):
+        self.metrics = metrics
+        self.path = path
+        self.phases = {}
+        self.input_bytes = None
+        self.output_bytes = 0
+        self.measures = 0
+        self.notes = 0
+        self.error = None
+        self.seconds = None
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def countReader(self, reader):
+        """ count the measures and notes of the parts reader has parsed """
+        if self.metrics is None:
+            return
+        is_loaded = getattr(reader, 'isPartLoaded', None)
+        for part_id in reader.getPartIdList():
+            if is_loaded is None or is_loaded(part_id):
+                self.measures += reader.getMeasureCount(part_id)
+                self.notes += reader.getNoteCount(part_id)
+
+    def countOutput(self, content):
+        self.output_bytes += len(content.encode('utf-8'))
+
+    def toDict(self):
+        return {
+            'file': self.path,
+            'seconds': self.seconds,
+            'parse_seconds': self.phases.get('parse'),
+            'render_seconds': self.phases.get('render'),
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'measures': self.measures,
+            'notes': self.notes,
+            'error': self.error,
+        }
+
+    def __enter__(self):
+        if self.path and self.path != '-':
+            try:
+                self.input_bytes = os.path.getsize(self.path)
+            except OSError:
+                pass
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        if self.metrics is not None:
+            self.metrics.add(self)
+        return False
+
+class _Phase:
+
+    def __init__(self, record, name):
+        self._record = record
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        phases = self._record.phases
+        phases[self._name] = phases.get(self._name, 0) + time.perf_counter() - self._start
+        return False
+
+def recordFile(metrics, path):
+    """ a FileRecord for path, reported to metrics unless it is None """
+    return metrics.record(path) if metrics is not None else FileRecord(None, path)
+
+class ConversionMetrics:
+    """ counters and histograms of a conversion run.
+
+    With format 'prometheus', write() replaces path with the metrics in the
+    Prometheus text format, for a node exporter textfile collector. With
+    'jsonl', every file is appended to path as a JSON line when it is done
+    and close() appends a summary line with p50/p99 latencies. Records may
+    be added from several threads.
+    """
+
+    FORMATS = ('prometheus', 'jsonl')
+    PREFIX = 'musicxml_conversion'
+
+    def __init__(self, path=None, format='prometheus'):
+        if format not in self.FORMATS:
+            raise ValueError("unsupported metrics format: %s" % format)
+        self.path = path
+        self.format = format
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock() # one write() at a time, so the newest metrics land last
+        self._stream = open(path, 'a', encoding='utf-8') if path and format == 'jsonl' else None
+        self.files = 0
+        self.errors = {} # exception type name -> count
+        self.measures = 0
+        self.notes = 0
+        self.output_bytes = 0
+        self.seconds = Histogram(DURATION_BUCKETS)
+        self.parse_seconds = Histogram(DURATION_BUCKETS)
+        self.render_seconds = Histogram(DURATION_BUCKETS)
+        self.input_bytes = Histogram(SIZE_BUCKETS)
+
+    def record(self, path):
+        return FileRecord(self, path)
+
+    def add(self, record):
+        with self._lock:
+            self.files += 1
+            if record.error is not None:
+                self.errors[record.error] = self.errors.get(record.error, 0) + 1
+            self.measures += record.measures
+            self.notes += record.notes
+            self.output_bytes += record.output_bytes
+            self.seconds.observe(record.seconds)
+            if 'parse' in record.phases:
+                self.parse_seconds.observe(record.phases['parse'])
+            if 'render' in record.phases:
+                self.render_seconds.observe(record.phases['render'])
+            if record.input_bytes is not None:
+                self.input_bytes.observe(record.input_bytes)
+            if self._stream is not None:
+                self._stream.write(json.dumps(record.toDict(), ensure_ascii=False) + '\n')
+
+    def getSummary(self):
+        with self._lock:
+            return {
+                'files': self.files,
+                'errors': dict(self.errors),
+                'measures': self.measures,
+                'notes': self.notes,
+                'output_bytes': self.output_bytes,
+                'p50_seconds': self.seconds.quantile(0.5),
+                'p99_seconds': self.seconds.quantile(0.99),
+                'p50_parse_seconds': self.parse_seconds.quantile(0.5),
+                'p99_parse_seconds': self.parse_seconds.quantile(0.99),
+                'p50_render_seconds': self.render_seconds.quantile(0.5),
+                'p99_render_seconds': self.render_seconds.quantile(0.99),
+                'peak_rss_bytes': getPeakRSS(),
+            }
+
+    def toPrometheus(self):
+        """ return the metrics in the Prometheus text exposition format """
+        prefix = self.PREFIX
+        lines = []
+
+        def _counter(name, help, value, labels=''):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            lines.append(f"{prefix}_{name}{labels} {value}")
+
+        def _histogram(name, help, histogram):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for bound, count in histogram.iterCumulative():
+                lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{prefix}_{name}_sum {histogram.sum}")
+            lines.append(f"{prefix}_{name}_count {histogram.count}")
+
+        with self._lock:
+            _counter('files_total', "Input files converted, including failed ones.", self.files)
+            lines.append(f"# HELP {prefix}_errors_total Failed conversions by exception type.")
+            lines.append(f"# TYPE {prefix}_errors_total counter")
+            for error_type, count in sorted(self.errors.items()):
+                lines.append(f'{prefix}_errors_total{{type="{error_type}"}} {count}')
+            _counter('measures_total', "Measures in the parsed parts.", self.measures)
+            _counter('notes_total', "Notes in the parsed parts.", self.notes)
+            _counter('output_bytes_total', "Bytes of output written.", self.output_bytes)
+            _histogram('seconds', "Conversion time per file.", self.seconds)
+            _histogram('parse_seconds', "Parse time per file.", self.parse_seconds)
+            _histogram('render_seconds', "Render time per file.", self.render_seconds)
+            _histogram('input_bytes', "Size of the input files.", self.input_bytes)
+        peak_rss = getPeakRSS()
+        if peak_rss is not None:
+            lines.append(f"# HELP {prefix}_peak_rss_bytes Peak resident set size of the process.")
+            lines.append(f"# TYPE {prefix}_peak_rss_bytes gauge")
+            lines.append(f"{prefix}_peak_rss_bytes {peak_rss}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """ publish what was recorded so far; safe to call from several threads """
+        with self._write_lock:
+            if self._stream is not None:
+                self._stream.flush()
+            elif self.path and self.format == 'prometheus':
+                temp_path = self.path + '.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.toPrometheus())
+                os.replace(temp_path, self.path) # scrapers never see a partial file
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.write(json.dumps(dict(self.getSummary(), summary=True), ensure_ascii=False) + '\n')
+            self._stream.close()
+            self._stream = None
+        else:
+            self.write()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import collections
+import logging
+import os
+import zipfile
+
+from conversion import iterSubmitted, renderOutputs, writeOutputFiles
+from reader import DEFAULT_LIMITS, LazyMusicXMLReader, MusicXMLReader, readCompressedMusicXML
+from metrics import recordFile
+
+logger = logging.getLogger(__name__)
+
+def readSource(input_file, limits=None):
+    """ return the MusicXML bytes of input_file; MXL containers are unpacked.
+    Runs in the prefetch threads, which wait on storage and zlib without the GIL """
+    limits = limits or DEFAULT_LIMITS
+    if zipfile.is_zipfile(input_file):
+        return readCompressedMusicXML(input_file, limits)
+    limits.checkSize(os.path.getsize(input_file))
+    with open(input_file, 'rb') as f:
+        return f.read()
+
+def iterPrefetched(input_files, executor, depth, limits=None):
+    """ yield (input file, future of readSource(input file)) in order, with
+    reads of the next files started in executor so that up to depth files
+    are read or held ahead of the consumer """
+    jobs = ((input_file, (input_file, limits)) for input_file in input_files)
+    return iterSubmitted(executor, readSource, jobs, depth)
+
+def convertData(data, mode, tempo, keys=None, unfold=False, split_voices=False, part_index=None,
+                measure_cache=None, limits=None, record=None):
+    """ return renderOutputs(...) for the MusicXML bytes of a score """
+    record = record or recordFile(None, None)
+    if mode == 'lyrics':
+        from lyrics import renderLyrics
+        with record.phase('render'):
+            return renderLyrics(data, limits)
+    reader_class = LazyMusicXMLReader if part_index is not None else MusicXMLReader
+    with record.phase('parse'):
+        reader = reader_class.fromBytes(data, limits)
+    with record.phase('render'):
+        outputs = renderOutputs(reader, mode, tempo, keys, unfold, split_voices, part_index, measure_cache)
+    record.countReader(reader)
+    return outputs
+
+def convertPipelined(input_files, mode, tempo, keys=None, unfold=False, split_voices=False, part_index=None,
+                     measure_cache=None, metrics=None, limits=None, prefetch_workers=4, queue_depth=8):
+    """ convert input_files in order, overlapping storage with parsing.
+
+    prefetch_workers threads read and unpack the next queue_depth inputs
+    while the calling thread parses and renders, and a writer thread saves
+    outputs next to their inputs; at most queue_depth results wait to be
+    written. Return a list of (input file, output filenames or the
+    exception raised), like convertBundle.
+    """
+    results = []
+
+    def _collect(input_file, get_filenames):
+        try:
+            results.append((input_file, get_filenames()))
+        except Exception as e:
+            logger.error("%s: conversion failed: %s: %s", input_file, type(e).__name__, e)
+            results.append((input_file, e))
+
+    with ThreadPoolExecutor(max_workers=prefetch_workers) as reader_pool, \
+            ThreadPoolExecutor(max_workers=1) as writer_pool:
+        writes = collections.deque()
+        for input_file, data in iterPrefetched(input_files, reader_pool, queue_depth, limits):
+            try:
+                with recordFile(metrics, input_file) as record:
+                    outputs = convertData(data.result(), mode, tempo, keys, unfold, split_voices, part_index,
+                                          measure_cache, limits, record)
+                    for suffix, d in outputs:
+                        record.countOutput(d)
+            except Exception as e:
+                future = Future() # failures keep their place among the results
+                future.set_exception(e)
+            else:
+                future = writer_pool.submit(writeOutputFiles, input_file, outputs)
+            writes.append((input_file, future))
+            while len(writes) >= queue_depth or (writes and writes[0][1].done()):
+                input_file, future = writes.popleft()
+                _collect(input_file, future.result)
+        while writes:
+            input_file, future = writes.popleft()
+            _collect(input_file, future.result)
+    return results
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+from reader import MUSICXML_FIFTHS_TABLE, iterparseScore, releaseElement
+
+PREFLIGHT_TAGS = ('score-partwise', 'score-timewise', 'part', 'measure', 'note', 'backup', 'forward',
+                  'key', 'time', 'staves', 'sound', 'lyric')
+
+class PartProfile:
+    """ counters of one part gathered by preflight """
+
+    def __init__(self, part_id):
+        self.part_id = part_id
+        self.measures = 0
+        self.notes = 0
+        self.chords = 0
+        self.rests = 0
+        self.grace_notes = 0
+        self.lyrics = 0
+        self.backups = 0
+        self.forwards = 0
+        self.staves = 1
+        self.staffs = set()
+        self.voices = set()
+        self.key = None
+        self.key_changes = 0
+        self.time = None
+        self.time_changes = 0
+        self.initial_tempo = None
+        self.tempo_changes = 0
+
+    def toDict(self):
+        return {
+            'id': self.part_id,
+            'measures': self.measures,
+            'notes': self.notes,
+            'chords': self.chords,
+            'rests': self.rests,
+            'grace_notes': self.grace_notes,
+            'lyrics': self.lyrics,
+            'backups': self.backups,
+            'forwards': self.forwards,
+            'staves': max(self.staves, len(self.staffs)),
+            'voices': len(self.voices) or 1,
+            'key_changes': self.key_changes,
+            'time_changes': self.time_changes,
+            'initial_tempo': self.initial_tempo,
+            'tempo_changes': self.tempo_changes,
+        }
+
+def _describeIssues(root_tag, parts):
+    issues = []
+    if root_tag != 'score-partwise':
+        issues.append("unsupported root element: %s" % root_tag)
+    if not parts:
+        issues.append("no parts")
+    elif parts[0].initial_tempo is None:
+        issues.append("no tempo in the first measure")
+    for part in parts:
+        if len(part.voices) > 1:
+            issues.append("part %s has %d voices" % (part.part_id, len(part.voices)))
+        if part.backups:
+            issues.append("part %s moves back in time %d times" % (part.part_id, part.backups))
+        if part.key_changes:
+            issues.append("part %s changes key %d times" % (part.part_id, part.key_changes))
+        if part.time_changes:
+            issues.append("part %s changes time signature %d times" % (part.part_id, part.time_changes))
+    return issues
+
+def preflight(source, limits=None):
+    """ return a profile of the score in source (a filename or bytes) from one
+    streaming pass that builds no Measure or Note objects: counts per part
+    and in total, and the issues the converter is known to mishandle """
+    parts = []
+    part = None
+    root_tag = None
+    in_first_measure = False
+    first_sound_seen = False
+
+    for event, elem in iterparseScore(source, PREFLIGHT_TAGS, ('start', 'end'), limits):
+        tag = elem.tag
+        if event == 'start':
+            if root_tag is None:
+                root_tag = tag
+            if tag == 'part' and elem.getparent() is not None and elem.getparent().tag == 'score-partwise':
+                part = PartProfile(elem.get('id'))
+                parts.append(part)
+            elif tag == 'measure' and part is not None:
+                in_first_measure = part.measures == 0
+                first_sound_seen = False
+            continue
+
+        if part is None: # score-timewise, or elements of the header
+            if tag in ('measure', 'score-timewise'):
+                releaseElement(elem)
+            continue
+
+        if tag == 'note':
+            part.notes += 1
+            if elem.find('chord') is not None:
+                part.chords += 1
+            if elem.find('rest') is not None:
+                part.rests += 1
+            if elem.find('grace') is not None:
+                part.grace_notes += 1
+            part.voices.add(elem.findtext('voice') or '1')
+            staff = elem.findtext('staff')
+            if staff:
+                part.staffs.add(staff)
+        elif tag == 'lyric':
+            part.lyrics += 1
+        elif tag == 'backup':
+            part.backups += 1
+        elif tag == 'forward':
+            part.forwards += 1
+        elif tag == 'staves':
+            part.staves = max(part.staves, int(elem.text))
+        elif tag == 'key':
+            fifths = elem.findtext('fifths')
+            key = MUSICXML_FIFTHS_TABLE.get(int(fifths), fifths) if fifths is not None else None
+            if part.key is not None and key != part.key:
+                part.key_changes += 1
+            part.key = key
+        elif tag == 'time':
+            time = (elem.findtext('beats'), elem.findtext('beat-type'))
+            if part.time is not None and time != part.time:
+                part.time_changes += 1
+            part.time = time
+        elif tag == 'sound':
+            # Measure.getTempo reads the first direction/sound of the measure, tempo or not
+            parent = elem.getparent()
+            is_direction_sound = (parent is not None and parent.tag == 'direction'
+                                  and parent.getparent() is not None and parent.getparent().tag == 'measure')
+            if in_first_measure and is_direction_sound and not first_sound_seen:
+                first_sound_seen = True
+                part.initial_tempo = elem.get('tempo')
+            elif 'tempo' in elem.attrib:
+                part.tempo_changes += 1
+        elif tag == 'measure':
+            part.measures += 1
+            releaseElement(elem)
+        elif tag == 'part':
+            releaseElement(elem)
+            part = None
+
+    part_profiles = [p.toDict() for p in parts]
+    return {
+        'root': root_tag,
+        'parts': part_profiles,
+        'part_count': len(parts),
+        'staves': sum(p['staves'] for p in part_profiles),
+        'voices': sum(p['voices'] for p in part_profiles),
+        'measures': sum(p['measures'] for p in part_profiles),
+        'notes': sum(p['notes'] for p in part_profiles),
+        'issues': _describeIssues(root_tag, parts),
+    }
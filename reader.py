@@ -1,6 +1,13 @@
 #!/usr/bin/env python
 
 from lxml import etree
+import copy
+import io
+import itertools
+import os.path
+import re
+import threading
+import time
 import zipfile
 
 MUSICXML_FIFTHS_TABLE = {
@@ -14,6 +21,74 @@ MUSICXML_FIFTHS_TABLE = {
 class MusicXMLParseError(Exception):
     pass
 
+class MusicXMLLimitError(MusicXMLParseError):
+    pass
+
+def createParser(huge_tree=False):
+    """ return a parser that never touches the network, loads DTDs or expands entities """
+    return etree.XMLParser(
+        no_network=True,
+        load_dtd=False,
+        dtd_validation=False,
+        resolve_entities=False,
+        remove_blank_text=True,
+        remove_comments=True,
+        remove_pis=True,
+        huge_tree=huge_tree)
+
+_PARSERS = threading.local()
+
+def getThreadParser(huge_tree=False):
+    """ the createParser parser of the calling thread; lxml serializes the
+    use of one parser, so threads parsing at the same time each get their own """
+    parsers = _PARSERS.__dict__
+    parser = parsers.get(huge_tree)
+    if parser is None:
+        parser = parsers[huge_tree] = createParser(huge_tree)
+    return parser
+
+class ReaderLimits:
+    """ bounds applied to untrusted input; None disables a limit """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_depth=64,
+                 max_measures=100000, time_budget=None, huge_tree=False):
+        self.max_bytes = max_bytes
+        self.max_depth = max_depth
+        self.max_measures = max_measures
+        self.time_budget = time_budget # seconds per conversion
+        self.huge_tree = huge_tree
+
+    def getParser(self):
+        return getThreadParser(self.huge_tree)
+
+    def checkSize(self, size):
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise MusicXMLLimitError("input too large: %d bytes (limit %d)" % (size, self.max_bytes))
+
+    def checkDepth(self, root):
+        """ reject trees with an element more than max_depth levels deep, root
+        being level 1; one XPath query evaluated by libxml2 """
+        if self.max_depth is None:
+            return
+        if root.xpath('boolean(%s)' % '/'.join(['*'] * self.max_depth)):
+            raise MusicXMLLimitError("document nested deeper than %d elements" % self.max_depth)
+
+    def checkMeasureCount(self, root):
+        if self.max_measures is None:
+            return
+        self.checkMeasureTotal(int(root.xpath('count(part/measure)')))
+
+    def checkMeasureTotal(self, count):
+        if self.max_measures is not None and count > self.max_measures:
+            raise MusicXMLLimitError("too many measures: %d (limit %d)" % (count, self.max_measures))
+
+    def getDeadline(self):
+        if self.time_budget is None:
+            return None
+        return time.monotonic() + self.time_budget
+
+DEFAULT_LIMITS = ReaderLimits()
+
 class Attributes:
 
     def __init__(self, elem, prev_attributes=None):
@@ -27,6 +102,10 @@ class Attributes:
             'divisions': self._getDivisions(prev_attributes),
         }
 
+    def __getstate__(self):
+        # only the resolved values travel; the element stays with its document
+        return {'_elem': None, '_cache': self._cache}
+
     def _getDivisions(self, prev_attributes):
         divisions = self._elem.find('divisions')
         if divisions is None:
@@ -171,9 +250,30 @@ class Note:
             return text
         return None
 
+    def getVoice(self):
+        return self._get_text('voice') or '1'
+
     def getStaff(self):
         return self._get_text('staff')
 
+    # children the writers render a note from; lyrics are rendered on their own line
+    RENDERED_TAGS = ('chord', 'rest', 'grace', 'pitch', 'accidental', 'duration', 'tie',
+                     'time-modification', 'notations')
+
+    def getFingerprint(self):
+        """ canonical key of everything the writers render from this note,
+        built in one pass over its children; of <notations> only the tuplet
+        types count """
+        key = []
+        for child in self._elem.iterchildren(*self.RENDERED_TAGS):
+            if child.tag == 'notations':
+                key.extend(('tuplet', tuplet.get('type')) for tuplet in child.iterchildren('tuplet'))
+            elif len(child):
+                key.append((child.tag, tuple((sub.tag, sub.text) for sub in child)))
+            else:
+                key.append((child.tag, child.text, child.get('type')))
+        return tuple(key)
+
     def getAttributes(self):
         return self._attributes
 
@@ -184,15 +284,23 @@ class Measure:
     BARLINE_FINAL = "FINAL"
     BARLINE_REPEAT = "REPEAT"
 
-    def __init__(self, elem, prev_measure=None, staff_filter=None):
+    def __init__(self, elem, prev_measure=None, staff_filter=None, prev_attributes=None,
+                 voice_filter=None, voice_streams=None):
         assert(elem.tag == 'measure')
         assert(not prev_measure or isinstance(prev_measure, Measure))
         self._elem = elem
-        self._prev_measure = prev_measure
-
         self._staff_filter = staff_filter
-
-        prev_attributes = prev_measure.getAttributes() if prev_measure else None
+        self._voice_filter = voice_filter
+        self._voice_streams = voice_streams # shared by the clones of a measure
+        self._notes = None
+        self._slices = None
+        self._fingerprint = None
+
+        # only the previous attributes are kept, so a measure never holds on
+        # to the measures before it
+        if prev_measure:
+            prev_attributes = prev_measure.getAttributes()
+        self._prev_attributes = prev_attributes
         attributes_elem = self._elem.find('attributes')
 
         if not prev_attributes and attributes_elem is None:
@@ -205,10 +313,19 @@ class Measure:
 
         assert(self._attributes is not None)
 
-    def cloneOnlyStaff(self, staff_filter):
-        m = Measure(self._elem, self._prev_measure, staff_filter)
+    def cloneOnlyStaff(self, staff_filter, voice_filter=None):
+        voice_streams = self._getAllVoiceStreams() if voice_filter is not None else self._voice_streams
+        m = Measure(self._elem, staff_filter=staff_filter, prev_attributes=self._prev_attributes,
+                    voice_filter=voice_filter, voice_streams=voice_streams)
         return m
 
+    def release(self):
+        """ free the children of the underlying element; the measure is unusable afterwards """
+        self._notes = None
+        self._slices = None
+        self._voice_streams = None
+        self._elem.clear()
+
     def getMeasureNumber(self):
         return int(self._elem.get('number'))
 
@@ -219,6 +336,11 @@ class Measure:
         tempo_elem = self._elem.find('direction/sound')
         return tempo_elem.attrib['tempo']
 
+    def findTempo(self):
+        """ the tempo getTempo returns, or None where it has none to return """
+        tempo_elem = self._elem.find('direction/sound')
+        return tempo_elem.get('tempo') if tempo_elem is not None else None
+
     def _getBarLine(self, location):
         bar_style = self._elem.xpath('barline[@location="%s"]/bar-style' % location)
         repeat = self._elem.xpath('barline[@location="%s"]/repeat' % location)
@@ -239,6 +361,40 @@ class Measure:
     def getRightBarlineType(self):
         return self._getBarLine('right')
 
+    def getNavigation(self):
+        """ return a dict of the repeat, ending and jump marks of this measure:
+        forward/backward repeats, the number of times a backward repeat is
+        played, the ending numbers started here, whether an ending stops here,
+        and the segno/coda/tocoda/dalsegno/dacapo/fine attributes of <sound> """
+        navigation = {
+            'forward': bool(self._elem.xpath('barline/repeat[@direction="forward"]')),
+            'backward': bool(self._elem.xpath('barline/repeat[@direction="backward"]')),
+            'times': 2,
+            'ending': None,
+            'ending_stop': bool(self._elem.xpath('barline/ending[@type="stop" or @type="discontinue"]')),
+        }
+        times = self._elem.xpath('barline/repeat[@direction="backward"]/@times')
+        if times:
+            navigation['times'] = int(times[0])
+        ending = self._elem.xpath('barline/ending[@type="start"]/@number')
+        if ending:
+            navigation['ending'] = frozenset(int(n) for n in ending[0].replace(',', ' ').split())
+        for sound in self._elem.xpath('sound | direction/sound'):
+            for mark in ('segno', 'coda', 'tocoda', 'dalsegno', 'dacapo', 'fine'):
+                if mark in sound.attrib:
+                    navigation[mark] = sound.attrib[mark]
+        return navigation
+
+    def getFingerprint(self):
+        """ canonical key of the notes of this measure and the attributes
+        they are rendered with; barlines are not included """
+        if self._fingerprint is None:
+            attributes = self.getAttributes()
+            self._fingerprint = (attributes.getKeySignature(), attributes.getDivisions(),
+                                 self._staff_filter, self._voice_filter,
+                                 tuple(note.getFingerprint() for note in self))
+        return self._fingerprint
+
     def getStaffs(self):
         s = {}
         for elem in self._elem.xpath('note'):
@@ -249,30 +405,186 @@ class Measure:
 
         return s
 
+    def _getAllVoiceStreams(self):
+        if self._voice_streams is None:
+            streams = {}
+            position = 0
+            onset = 0
+            for elem in self._elem.iterchildren('note', 'backup', 'forward'):
+                if elem.tag == 'backup':
+                    position -= int(elem.findtext('duration') or 0)
+                elif elem.tag == 'forward':
+                    position += int(elem.findtext('duration') or 0)
+                else:
+                    note = Note(elem, self.getAttributes())
+                    if elem.find('chord') is None: # chord notes share the onset of their root
+                        onset = position
+                        if elem.find('grace') is None:
+                            position += note.getDuration()[0] # the length the writers render
+                    key = (elem.findtext('staff'), elem.findtext('voice') or '1')
+                    streams.setdefault(key, []).append((onset, note))
+            self._voice_streams = streams
+        return self._voice_streams
+
+    def getVoiceStreams(self):
+        """ return {(staff, voice): [(onset, note), ...]} in document order,
+        with onsets in divisions from the start of the measure. The streams
+        come from one walk over <note>, <backup> and <forward> and are shared
+        with the clones of this measure; staff is None for single staff parts """
+        streams = self._getAllVoiceStreams()
+        if self._staff_filter:
+            streams = {key: stream for key, stream in streams.items() if key[0] in self._staff_filter}
+        if self._voice_filter is not None:
+            streams = {key: stream for key, stream in streams.items() if key[1] == self._voice_filter}
+        return streams
+
+    def getVoices(self):
+        """ return the (staff, voice) keys used in this measure, in order of appearance """
+        return list(self.getVoiceStreams().keys())
+
+    def getNotes(self):
+        """ return the notes passing the staff and voice filters; built once per measure """
+        if self._notes is None and self._voice_filter is not None:
+            self._notes = [note for stream in self.getVoiceStreams().values() for onset, note in stream]
+        if self._notes is None:
+            notes = [Note(elem, self.getAttributes()) for elem in self._elem.xpath('note')]
+            if self._staff_filter:
+                notes = [n for n in notes if n.getStaff() in self._staff_filter]
+            self._notes = notes
+        return self._notes
+
+    def getSlices(self):
+        """ return the notes grouped into vertical slices, each a chord's root
+        note followed by its <chord/> notes; built once per measure """
+        if self._slices is None:
+            slices = []
+            for note in self.getNotes():
+                if slices and note._elem.find('chord') is not None:
+                    slices[-1].append(note)
+                else:
+                    slices.append([note])
+            self._slices = slices
+        return self._slices
+
     def __iter__(self):
-        for elem in self._elem.xpath('note'):
-            n = Note(elem, self.getAttributes())
-            if self._staff_filter and not n.getStaff() in self._staff_filter:
-                continue
-            yield n
+        return iter(self.getNotes())
+
+ZIP_MAGIC = b'PK\x03\x04'
 
-def readCompressedMusicXML(filename):
-    archive = zipfile.ZipFile(filename)
+def readCompressedMusicXML(filename, limits=DEFAULT_LIMITS):
     try:
+        archive = zipfile.ZipFile(filename)
         container_xml = archive.read('META-INF/container.xml')
-        container_root = etree.fromstring(container_xml)
+        container_root = etree.fromstring(container_xml, getThreadParser())
         musicxml_filename = container_root.xpath('rootfiles/rootfile')[0].attrib.get('full-path')
-        return archive.read(musicxml_filename)
+        info = archive.getinfo(musicxml_filename)
+    except:
+        raise MusicXMLParseError("Failed to read compressed MusicXML")
+    limits.checkSize(info.file_size) # uncompressed size, guards against zip bombs
+    try:
+        return archive.read(info)
     except:
         raise MusicXMLParseError("Failed to read compressed MusicXML")
 
-class MusicXMLReader:
+def iterparseScore(source, tag=None, events=('end',), limits=None):
+    """ yield (event, element) from an incremental parse of a MusicXML
+    filename or bytes, with the hardening of createParser; MXL containers
+    are unpacked first. Elements are built but never released here, so
+    callers clear what they are done with """
+    limits = limits or DEFAULT_LIMITS
+    if isinstance(source, (bytes, bytearray)):
+        limits.checkSize(len(source))
+        data = bytes(source)
+        if data.startswith(ZIP_MAGIC):
+            data = readCompressedMusicXML(io.BytesIO(data), limits)
+        stream = io.BytesIO(data)
+    elif zipfile.is_zipfile(source):
+        stream = io.BytesIO(readCompressedMusicXML(source, limits))
+    else:
+        limits.checkSize(os.path.getsize(source))
+        stream = open(source, 'rb')
+    try:
+        context = etree.iterparse(stream, events=events, tag=tag, no_network=True, load_dtd=False,
+                                  resolve_entities=False, remove_blank_text=True, remove_comments=True,
+                                  remove_pis=True, huge_tree=limits.huge_tree)
+        yield from context
+    except etree.XMLSyntaxError as e:
+        raise MusicXMLParseError("malformed MusicXML: %s" % e)
+    finally:
+        stream.close()
+
+def releaseElement(elem):
+    """ free an element handled by iterparseScore and the siblings before it """
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
 
-    def __init__(self, filename):
-        if zipfile.is_zipfile(filename):
-            self._root = etree.fromstring(readCompressedMusicXML(filename))
-        else:
-            self._root = etree.parse(filename).getroot()
+class MusicXMLReader:
+    """ a parsed MusicXML score.
+
+    The tree is not changed after construction, so one reader can serve
+    renders on many threads at once; every iterMeasures call builds its own
+    Measure objects. Iterating with release=True clears the tree as it goes
+    and is only for a reader used by a single render; it lowers the memory
+    held as the render proceeds, but the whole tree is parsed up front, so
+    peak memory is unchanged.
+    """
+
+    def __init__(self, filename, limits=None):
+        limits = limits or DEFAULT_LIMITS
+        self._limits = limits
+        self._deadline = limits.getDeadline()
+        parser = limits.getParser()
+        try:
+            if zipfile.is_zipfile(filename):
+                root = etree.fromstring(readCompressedMusicXML(filename, limits), parser)
+            else:
+                limits.checkSize(os.path.getsize(filename))
+                root = etree.parse(filename, parser).getroot()
+        except etree.XMLSyntaxError as e:
+            raise MusicXMLParseError("malformed MusicXML: %s" % e)
+        self._load(root)
+
+    @classmethod
+    def open(cls, source, limits=None):
+        """ read a filename, or the bytes of a MusicXML document or MXL container """
+        if isinstance(source, (bytes, bytearray)):
+            return cls.fromBytes(bytes(source), limits)
+        return cls(source, limits)
+
+    @classmethod
+    def fromBytes(cls, data, limits=None):
+        """ read a MusicXML document or MXL container held in memory """
+        reader = cls.__new__(cls)
+        limits = limits or DEFAULT_LIMITS
+        reader._limits = limits
+        reader._deadline = limits.getDeadline()
+        limits.checkSize(len(data))
+        try:
+            if data.startswith(ZIP_MAGIC):
+                data = readCompressedMusicXML(io.BytesIO(data), limits)
+            root = etree.fromstring(data, limits.getParser())
+        except etree.XMLSyntaxError as e:
+            raise MusicXMLParseError("malformed MusicXML: %s" % e)
+        reader._load(root)
+        return reader
+
+    @classmethod
+    def fromFile(cls, fileobj, limits=None):
+        """ read a MusicXML document or MXL container from a binary file object """
+        limits = limits or DEFAULT_LIMITS
+        if limits.max_bytes is None:
+            data = fileobj.read()
+        else: # never read more than one byte past the limit
+            data = fileobj.read(limits.max_bytes + 1)
+        return cls.fromBytes(data, limits)
+
+    def _load(self, root):
+        self._root = root
+        self._limits.checkDepth(self._root)
+        self._limits.checkMeasureCount(self._root)
         if self._root.tag != 'score-partwise':
             raise MusicXMLParseError("error: unsupported root element: %s" % self._root.tag)
         self._parts = [x.attrib.get('id')
@@ -292,7 +604,11 @@ class MusicXMLReader:
             return None
 
     def _getFirstMeasure(self):
-        return next(self.iterMeasures(self._parts[0]))
+        return self.getFirstMeasure(self._parts[0])
+
+    def _getPartElement(self, partId):
+        parts = self._root.xpath("part[@id='%s']" % partId)
+        return parts[0] if parts else None
 
     def getWorkTitle(self):
         ret = self._get_text('work/work-title')
@@ -319,9 +635,211 @@ class MusicXMLReader:
     def getPartDetailsList(self):
         return self._parts_details
 
-    def iterMeasures(self, partId):
-        prev_measure = None
-        for elem in self._root.xpath("part[@id='%s']/measure" % partId):
-            measure = Measure(elem, prev_measure)
+    def checkTimeBudget(self):
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise MusicXMLLimitError("conversion exceeded time budget of %ss" % self._limits.time_budget)
+
+    def getFirstMeasure(self, partId):
+        return next(self.iterMeasures(partId))
+
+    def getMeasureCount(self, partId):
+        part = self._getPartElement(partId)
+        return int(part.xpath("count(measure)")) if part is not None else 0
+
+    def getPartDivisions(self, partId):
+        """ return the set of <divisions> values used in a part """
+        part = self._getPartElement(partId)
+        values = part.xpath("measure/attributes/divisions/text()") if part is not None else ()
+        return {int(value) for value in values} or {1}
+
+    def getNoteCount(self, partId):
+        part = self._getPartElement(partId)
+        return int(part.xpath("count(measure/note)")) if part is not None else 0
+
+    def iterMeasures(self, partId, start=0, stop=None, prev_attributes=None):
+        """ iterate the measures of a part; when starting past the first
+        measure, prev_attributes must be the attributes in effect before start
+        (see getBoundaryAttributes) """
+        part = self._getPartElement(partId)
+        if part is None:
+            return
+        for elem in itertools.islice(part.iterchildren('measure'), start, stop):
+            self.checkTimeBudget()
+            measure = Measure(elem, prev_attributes=prev_attributes)
             yield measure
-            prev_measure = measure
+            prev_attributes = measure.getAttributes()
+
+    def getBoundaryAttributes(self, partId, starts):
+        """ return the Attributes in effect just before each measure index in
+        starts (None for index 0), reading only <attributes> elements """
+        part = self._getPartElement(partId)
+        starts = sorted(starts)
+        boundaries = {}
+        attributes = None
+        index = 0
+        for elem in (part.iterchildren('measure') if part is not None else ()):
+            while starts and starts[0] == index:
+                boundaries[starts.pop(0)] = attributes
+            if not starts:
+                break
+            attributes_elem = elem.find('attributes')
+            if attributes_elem is not None:
+                attributes = Attributes(attributes_elem, attributes)
+            index += 1
+        for start in starts: # past the end of the part
+            boundaries[start] = attributes
+        return boundaries
+
+    def iterMeasureWindows(self, partId, size, release=False, start=0, stop=None, prev_attributes=None):
+        """ yield lists of at most size measures. With release, the measures of a
+        window are released once the next window is requested, so the part can
+        only be iterated once. """
+        window = []
+        for measure in self.iterMeasures(partId, start, stop, prev_attributes):
+            window.append(measure)
+            if len(window) == size:
+                yield window
+                if release:
+                    for m in window:
+                        m.release()
+                window = []
+        if window:
+            yield window
+
+    def getMeasureSlice(self, start, stop):
+        """ return the bytes of a score holding the part list and measures
+        [start, stop) of every part; read with the attributes in effect before
+        start (see getBoundaryAttributes), it renders like that measure range """
+        root = etree.Element('score-partwise', self._root.attrib)
+        root.append(copy.deepcopy(self._root.find('part-list')))
+        for part_id in self._parts:
+            part = self._getPartElement(part_id)
+            part_slice = etree.SubElement(root, 'part', id=part_id)
+            if part is not None:
+                part_slice.extend(copy.deepcopy(elem)
+                                  for elem in itertools.islice(part.iterchildren('measure'), start, stop))
+        return etree.tostring(root, encoding='utf-8')
+
+class LazyMusicXMLReader(MusicXMLReader):
+    """ a MusicXMLReader that parses each <part> only when it is first used.
+
+    A first scan over the raw bytes records where every <part> element
+    starts and ends; only the score header is parsed up front. The first
+    measure of a part (for staff detection and initial attributes) is
+    parsed on its own without loading the rest of the part. Documents the
+    scan cannot split, e.g. UTF-16 or score-timewise, are parsed whole.
+    Each part is parsed once even when several threads ask for it.
+    """
+
+    DECLARATION = re.compile(rb'\s*<\?xml[^>]*\?>')
+    PART_START = re.compile(rb'<part\s[^>]*?\bid\s*=\s*["\']([^"\']*)["\']')
+    PART_END = b'</part>'
+    MEASURE_START = re.compile(rb'<measure[\s>]')
+    MEASURE_END = b'</measure>'
+
+    def __init__(self, filename, limits=None):
+        limits = limits or DEFAULT_LIMITS
+        if zipfile.is_zipfile(filename):
+            data = readCompressedMusicXML(filename, limits)
+        else:
+            limits.checkSize(os.path.getsize(filename))
+            with open(filename, 'rb') as f:
+                data = f.read()
+        self._init(data, limits)
+
+    @classmethod
+    def fromBytes(cls, data, limits=None):
+        reader = cls.__new__(cls)
+        limits = limits or DEFAULT_LIMITS
+        limits.checkSize(len(data))
+        if data.startswith(ZIP_MAGIC):
+            data = readCompressedMusicXML(io.BytesIO(data), limits)
+        reader._init(data, limits)
+        return reader
+
+    def _init(self, data, limits):
+        self._limits = limits
+        self._deadline = limits.getDeadline()
+        self._data = data
+        self._part_spans = self._indexParts(data)
+        self._part_elements = {}
+        self._first_measures = {}
+        self._part_locks = {part: threading.Lock() for part in self._part_spans or ()}
+
+        declaration = self.DECLARATION.match(data)
+        self._declaration = declaration.group(0) if declaration else b''
+
+        root = None
+        if self._part_spans:
+            header_end = min(start for start, end in self._part_spans.values())
+            try:
+                root = etree.fromstring(data[:header_end] + b'</score-partwise>', limits.getParser())
+            except etree.XMLSyntaxError:
+                pass # not a partwise document the scan understands
+        if root is None or root.tag != 'score-partwise':
+            self._part_spans = None
+            try:
+                root = etree.fromstring(data, limits.getParser())
+            except etree.XMLSyntaxError as e:
+                raise MusicXMLParseError("malformed MusicXML: %s" % e)
+            self._data = None
+        else:
+            limits.checkMeasureTotal(len(self.MEASURE_START.findall(data)))
+        self._load(root)
+
+    def _indexParts(self, data):
+        """ return {part id: (start, end)} byte offsets of every <part> element """
+        if data.startswith((b'\xff\xfe', b'\xfe\xff')): # UTF-16 cannot be scanned as bytes
+            return None
+        spans = {}
+        for match in self.PART_START.finditer(data):
+            end = data.find(self.PART_END, match.end())
+            if end < 0:
+                raise MusicXMLParseError("malformed MusicXML: unterminated part")
+            spans[match.group(1).decode('utf-8')] = (match.start(), end + len(self.PART_END))
+        return spans
+
+    def _parseFragment(self, fragment):
+        try:
+            elem = etree.fromstring(self._declaration + fragment, self._limits.getParser())
+        except etree.XMLSyntaxError as e:
+            raise MusicXMLParseError("malformed MusicXML: %s" % e)
+        self._limits.checkDepth(elem)
+        return elem
+
+    def isPartLoaded(self, partId):
+        return self._part_spans is None or partId in self._part_elements
+
+    def _getPartElement(self, partId):
+        if self._part_spans is None:
+            return super()._getPartElement(partId)
+        part = self._part_elements.get(partId)
+        if part is None and partId in self._part_spans:
+            with self._part_locks[partId]: # threads asking for one part wait for a single parse
+                part = self._part_elements.get(partId)
+                if part is None:
+                    start, end = self._part_spans[partId]
+                    part = self._part_elements[partId] = self._parseFragment(self._data[start:end])
+        return part
+
+    def getFirstMeasure(self, partId):
+        if self.isPartLoaded(partId) or partId not in self._part_spans:
+            return super().getFirstMeasure(partId)
+        measure = self._first_measures.get(partId)
+        if measure is None:
+            start, end = self._part_spans[partId]
+            measure_end = self._data.find(self.MEASURE_END, start, end)
+            if measure_end < 0: # no measures; let the full part decide
+                return super().getFirstMeasure(partId)
+            part = self._parseFragment(self._data[start:measure_end + len(self.MEASURE_END)] + self.PART_END)
+            # a thread racing here builds an equal measure; the first one stored is kept
+            measure = self._first_measures.setdefault(partId, Measure(part.find('measure')))
+        return measure
+
+    def getMeasureCount(self, partId):
+        if self.isPartLoaded(partId):
+            return super().getMeasureCount(partId)
+        if partId not in self._part_spans:
+            return 0
+        start, end = self._part_spans[partId]
+        return len(self.MEASURE_START.findall(self._data, start, end))
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+from reader import MusicXMLParseError
+
+class ScoreAttributes:
+    """ plain counterpart of reader.Attributes """
+
+    __slots__ = ('divisions', 'keysig', 'timesig')
+
+    def __init__(self, divisions, keysig, timesig):
+        self.divisions = divisions
+        self.keysig = keysig
+        self.timesig = timesig
+
+    @classmethod
+    def fromAttributes(cls, attributes):
+        return cls(attributes.getDivisions(), attributes.getKeySignature(), attributes.getTimeSignature())
+
+    def __reduce__(self):
+        return (ScoreAttributes, (self.divisions, self.keysig, self.timesig))
+
+    def getDivisions(self):
+        return self.divisions
+
+    def getKeySignature(self):
+        return self.keysig
+
+    def getTimeSignature(self):
+        return self.timesig
+
+class ScoreNote:
+    """ plain counterpart of reader.Note """
+
+    __slots__ = ('attributes', 'pitch', 'duration', 'tuplet_ratio', 'flags', 'lyric', 'staff', 'voice', 'onset')
+
+    FLAG_CHORD = 1
+    FLAG_REST = 2
+    FLAG_GRACE = 4
+    FLAG_TIE_START = 8
+    FLAG_TIE_STOP = 16
+    FLAG_TUPLET_START = 32
+    FLAG_TUPLET_STOP = 64
+
+    def __init__(self, attributes, pitch, duration, tuplet_ratio, flags, lyric, staff, voice='1', onset=0):
+        self.attributes = attributes
+        self.pitch = pitch # (note_name, octave) or None
+        self.duration = duration
+        self.tuplet_ratio = tuplet_ratio # (actual_notes, normal_notes) or None
+        self.flags = flags
+        self.lyric = lyric
+        self.staff = staff
+        self.voice = voice
+        self.onset = onset # divisions from the start of the measure
+
+    @classmethod
+    def fromNote(cls, note, attributes, onset=0):
+        flags = 0
+        for flag, test in ((cls.FLAG_CHORD, note.isChord), (cls.FLAG_REST, note.isRest),
+                           (cls.FLAG_GRACE, note.isGrace),
+                           (cls.FLAG_TIE_START, note.isTieStart), (cls.FLAG_TIE_STOP, note.isTieStop),
+                           (cls.FLAG_TUPLET_START, note.isTupletStart), (cls.FLAG_TUPLET_STOP, note.isTupletStop)):
+            if test():
+                flags |= flag
+
+        try:
+            pitch = note.getPitch()
+        except MusicXMLParseError:
+            pitch = None
+
+        tuplet_ratio = None
+        if note.isTuplet():
+            tuplet_ratio = (note._get_int("time-modification/actual-notes"),
+                            note._get_int("time-modification/normal-notes"))
+
+        return cls(attributes, pitch, note.getDuration()[0], tuplet_ratio, flags,
+                   note.getLyric(), note.getStaff(), note.getVoice(), onset)
+
+    def __reduce__(self):
+        return (ScoreNote, (self.attributes, self.pitch, self.duration, self.tuplet_ratio,
+                            self.flags, self.lyric, self.staff, self.voice, self.onset))
+
+    def isChord(self):
+        return bool(self.flags & self.FLAG_CHORD)
+
+    def isRest(self):
+        return bool(self.flags & self.FLAG_REST)
+
+    def isTieStart(self):
+        return bool(self.flags & self.FLAG_TIE_START)
+
+    def isTieStop(self):
+        return bool(self.flags & self.FLAG_TIE_STOP)
+
+    def isTuplet(self):
+        return self.tuplet_ratio is not None
+
+    def isTupletStart(self):
+        return bool(self.flags & self.FLAG_TUPLET_START)
+
+    def isTupletStop(self):
+        return bool(self.flags & self.FLAG_TUPLET_STOP)
+
+    def isGrace(self):
+        return bool(self.flags & self.FLAG_GRACE)
+
+    def getDisplayedDuration(self):
+        if not self.isTuplet():
+            return self.getDuration()
+        actual_notes, normal_notes = self.tuplet_ratio
+        return (self.duration * actual_notes // normal_notes, self.attributes.getDivisions())
+
+    def getDuration(self):
+        return (self.duration, self.attributes.getDivisions())
+
+    def getPitch(self):
+        if self.pitch is None:
+            raise MusicXMLParseError("this note does not have pitch")
+        return self.pitch
+
+    def getLyric(self):
+        return self.lyric
+
+    def getStaff(self):
+        return self.staff
+
+    def getVoice(self):
+        return self.voice
+
+    def getAttributes(self):
+        return self.attributes
+
+    def getFingerprint(self):
+        return (self.flags, self.pitch, self.duration, self.tuplet_ratio)
+
+class ScoreMeasure:
+    """ plain counterpart of reader.Measure """
+
+    __slots__ = ('number', 'attributes', 'tempo', 'barlines', 'navigation', 'notes', 'staff_filter', 'voice_filter')
+
+    def __init__(self, number, attributes, tempo, barlines, navigation, notes, staff_filter=None, voice_filter=None):
+        self.number = number
+        self.attributes = attributes
+        self.tempo = tempo
+        self.barlines = barlines # (left, right)
+        self.navigation = navigation
+        self.notes = notes
+        self.staff_filter = staff_filter
+        self.voice_filter = voice_filter
+
+    @classmethod
+    def fromMeasure(cls, measure, attributes):
+        tempo = measure.findTempo()
+        onsets = {id(note._elem): onset for stream in measure.getVoiceStreams().values()
+                  for onset, note in stream}
+        notes = [ScoreNote.fromNote(note, attributes, onsets.get(id(note._elem), 0)) for note in measure]
+        return cls(measure.getMeasureNumber(), attributes, tempo,
+                   (measure.getLeftBarlineType(), measure.getRightBarlineType()),
+                   measure.getNavigation(), notes)
+
+    def __reduce__(self):
+        return (ScoreMeasure, (self.number, self.attributes, self.tempo, self.barlines,
+                               self.navigation, self.notes, self.staff_filter, self.voice_filter))
+
+    def cloneOnlyStaff(self, staff_filter, voice_filter=None):
+        return ScoreMeasure(self.number, self.attributes, self.tempo, self.barlines,
+                            self.navigation, self.notes, staff_filter, voice_filter)
+
+    def release(self):
+        pass
+
+    def getMeasureNumber(self):
+        return self.number
+
+    def getAttributes(self):
+        return self.attributes
+
+    def getTempo(self):
+        if self.tempo is None:
+            raise MusicXMLParseError("tempo not found in measure %d" % self.number)
+        return self.tempo
+
+    def findTempo(self):
+        return self.tempo
+
+    def getLeftBarlineType(self):
+        return self.barlines[0]
+
+    def getRightBarlineType(self):
+        return self.barlines[1]
+
+    def getNavigation(self):
+        return self.navigation
+
+    def getStaffs(self):
+        return {note.staff: 1 for note in self.notes if note.staff}
+
+    def getVoiceStreams(self):
+        streams = {}
+        for note in self:
+            streams.setdefault((note.staff, note.voice), []).append((note.onset, note))
+        return streams
+
+    def getVoices(self):
+        return list(self.getVoiceStreams().keys())
+
+    def getFingerprint(self):
+        return (self.attributes.getKeySignature(), self.attributes.getDivisions(),
+                self.staff_filter, self.voice_filter,
+                tuple(note.getFingerprint() for note in self))
+
+    def getNotes(self):
+        notes = self.notes
+        if self.staff_filter:
+            notes = [note for note in notes if note.staff in self.staff_filter]
+        if self.voice_filter is not None:
+            notes = [note for note in notes if note.voice == self.voice_filter]
+        return notes
+
+    def getSlices(self):
+        slices = []
+        for note in self.getNotes():
+            if slices and note.flags & ScoreNote.FLAG_CHORD:
+                slices[-1].append(note)
+            else:
+                slices.append([note])
+        return slices
+
+    def __iter__(self):
+        return iter(self.getNotes())
+
+class Score:
+    """ a picklable snapshot of a MusicXMLReader.
+
+    Score offers the reader interface used by the writers, so it can be
+    rendered in a worker process or cached without the lxml tree. Notes of a
+    measure share one ScoreAttributes object, which pickle stores once.
+    """
+
+    def __init__(self, title, composer, parts_details, part_measures):
+        self._title = title
+        self._composer = composer
+        self._parts_details = parts_details
+        self._parts = [part['id'] for part in parts_details]
+        self._part_measures = part_measures # part id -> list of ScoreMeasure
+
+    @classmethod
+    def fromReader(cls, reader):
+        part_measures = {}
+        for part in reader.getPartIdList():
+            measures = []
+            converted = {} # Attributes are shared between measures; convert each once
+            for measure in reader.iterMeasures(part):
+                attributes = measure.getAttributes()
+                if id(attributes) not in converted:
+                    converted[id(attributes)] = (attributes, ScoreAttributes.fromAttributes(attributes))
+                measures.append(ScoreMeasure.fromMeasure(measure, converted[id(attributes)][1]))
+            part_measures[part] = measures
+        return cls(reader.getWorkTitle(), reader.getComposer(),
+                   [dict(details) for details in reader.getPartDetailsList()], part_measures)
+
+    def __getstate__(self):
+        return (self._title, self._composer, self._parts_details, self._part_measures)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def _getFirstMeasure(self):
+        return self.getFirstMeasure(self._parts[0])
+
+    def getWorkTitle(self):
+        return self._title
+
+    def getComposer(self):
+        return self._composer
+
+    def getInitialKeySignature(self):
+        return self._getFirstMeasure().getAttributes().getKeySignature()
+
+    def getInitialTimeSignature(self):
+        return self._getFirstMeasure().getAttributes().getTimeSignature()
+
+    def getInitialTempo(self):
+        return self._getFirstMeasure().getTempo()
+
+    def getPartIdList(self):
+        return self._parts
+
+    def getPartDetailsList(self):
+        return self._parts_details
+
+    def checkTimeBudget(self):
+        pass
+
+    def getFirstMeasure(self, partId):
+        return self._part_measures[partId][0]
+
+    def getMeasureCount(self, partId):
+        return len(self._part_measures.get(partId, ()))
+
+    def getPartDivisions(self, partId):
+        return {measure.getAttributes().getDivisions() for measure in self._part_measures.get(partId, ())} or {1}
+
+    def iterMeasures(self, partId, start=0, stop=None, prev_attributes=None):
+        return iter(self._part_measures.get(partId, [])[start:stop])
+
+    def getBoundaryAttributes(self, partId, starts):
+        measures = self._part_measures.get(partId, [])
+        return {start: measures[min(start, len(measures)) - 1].getAttributes() if start and measures else None
+                for start in starts}
+
+    def iterMeasureWindows(self, partId, size, release=False, start=0, stop=None, prev_attributes=None):
+        measures = self._part_measures.get(partId, [])[start:stop]
+        for i in range(0, len(measures), size):
+            yield measures[i:i + size]
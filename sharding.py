@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ProcessPoolExecutor
+
+from reader import MusicXMLReader
+from writer import WriterError
+
+def renderShard(data, writer, max_measures_per_line, body_args, line_count, prev_attributes, limits=None):
+    """ render the body lines of a measure slice; runs in a worker process """
+    reader = MusicXMLReader.fromBytes(data, limits)
+    lines = []
+    for chunk in writer.iterLineChunks(reader, max_measures_per_line, *body_args,
+                                       line_range=(0, line_count), prev_attributes=prev_attributes):
+        lines.extend(writer.generateChunkLines(chunk))
+    return lines
+
+def planShards(reader, max_measures_per_line, lines_per_shard):
+    """ return a list of (line_range, prev_attributes) covering every output line.
+
+    Shard boundaries fall on line boundaries, so each shard renders whole
+    lines, and the attributes inherited at each boundary are resolved here
+    from the <attributes> elements alone.
+    """
+    parts = reader.getPartIdList()
+    measure_count = max(reader.getMeasureCount(part) for part in parts)
+    line_count = -(-measure_count // max_measures_per_line)
+    line_ranges = [(first, min(first + lines_per_shard, line_count))
+                   for first in range(0, line_count, lines_per_shard)]
+
+    starts = [first * max_measures_per_line for first, stop in line_ranges]
+    boundaries = {part: reader.getBoundaryAttributes(part, starts) for part in parts}
+    return [(line_range, {part: boundaries[part][start] for part in parts})
+            for line_range, start in zip(line_ranges, starts)]
+
+def generateBodySharded(source, writer, max_measures_per_line, *body_args,
+                        workers=2, lines_per_shard=16, limits=None):
+    """ return writer.generateBody(reader, max_measures_per_line, *body_args)
+    for the score in source, rendering measure ranges in a process pool.
+
+    source is a MusicXMLReader, a filename or the file's bytes. It is parsed
+    once here; each worker gets and parses only the measures of its range
+    (see MusicXMLReader.getMeasureSlice). body_args are the extra
+    generateBody arguments of the writer, e.g. the part index for
+    ByguitarWriter; arguments the writer would otherwise derive from the
+    whole score, like ByguitarWriter's staff_parts, must be passed here.
+    """
+    if writer.unfold:
+        raise WriterError("unfolded output cannot be rendered in shards")
+
+    reader = source if isinstance(source, MusicXMLReader) else MusicXMLReader.open(source, limits)
+    shards = planShards(reader, max_measures_per_line, lines_per_shard)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(renderShard,
+                                   reader.getMeasureSlice(first * max_measures_per_line, stop * max_measures_per_line),
+                                   writer, max_measures_per_line, body_args, stop - first, prev_attributes, limits)
+                   for (first, stop), prev_attributes in shards]
+        lines = [line for future in futures for line in future.result()]
+    return '\n'.join(lines)
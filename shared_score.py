@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import sys
+import threading
+
+from score import Score, ScoreMeasure, ScoreNote
+
+# (column, array typecode); every note or measure has one entry per column
+NOTE_COLUMNS = (('attributes', 'i'), ('pitch', 'h'), ('octave', 'h'), ('duration', 'i'),
+                ('tuplet_actual', 'h'), ('tuplet_normal', 'h'), ('flags', 'h'),
+                ('staff', 'h'), ('voice', 'h'), ('onset', 'i'),
+                ('lyric_start', 'i'), ('lyric_stop', 'i'))
+MEASURE_COLUMNS = (('number', 'i'), ('attributes', 'i'), ('tempo', 'h'),
+                   ('left_barline', 'h'), ('right_barline', 'h'), ('navigation', 'h'),
+                   ('note_start', 'i'), ('note_stop', 'i'))
+
+ALIGNMENT = 8
+
+class SharedScoreDescriptor:
+    """ the small picklable part of a SharedScore: the shared memory block
+    name, where each column lives in it and the tables the columns index """
+
+    def __init__(self, name, layout, strings, attributes, navigations,
+                 title, composer, parts_details, part_ranges):
+        self.name = name
+        self.layout = layout # column -> (offset, typecode, length)
+        self.strings = strings # pitches, staffs, voices, tempos and barlines; -1 is None
+        self.attributes = attributes # list of ScoreAttributes
+        self.navigations = navigations
+        self.title = title
+        self.composer = composer
+        self.parts_details = parts_details
+        self.part_ranges = part_ranges # part id -> (first measure, stop)
+
+class _Columns:
+    """ zero-copy views of the columns of a shared memory block """
+
+    def __init__(self, shm, descriptor):
+        self.shm = shm
+        self.descriptor = descriptor
+        self.views = {}
+        for column, (offset, typecode, length) in descriptor.layout.items():
+            size = length * array(typecode).itemsize
+            self.views[column] = shm.buf[offset:offset + size].cast(typecode)
+
+    def string(self, index):
+        return self.descriptor.strings[index] if index >= 0 else None
+
+    def release(self):
+        for view in self.views.values():
+            view.release()
+        self.views.clear()
+
+class SharedNote(ScoreNote):
+    """ a ScoreNote reading its fields from the shared note columns """
+
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    def _get(self, column):
+        return self._columns.views['note_' + column][self._index]
+
+    @property
+    def attributes(self):
+        return self._columns.descriptor.attributes[self._get('attributes')]
+
+    @property
+    def pitch(self):
+        pitch = self._get('pitch')
+        return (self._columns.string(pitch), self._get('octave')) if pitch >= 0 else None
+
+    @property
+    def duration(self):
+        return self._get('duration')
+
+    @property
+    def tuplet_ratio(self):
+        actual_notes = self._get('tuplet_actual')
+        return (actual_notes, self._get('tuplet_normal')) if actual_notes else None
+
+    @property
+    def flags(self):
+        return self._get('flags')
+
+    @property
+    def lyric(self):
+        start = self._get('lyric_start')
+        if start < 0:
+            return None
+        return bytes(self._columns.views['lyrics'][start:self._get('lyric_stop')]).decode('utf-8')
+
+    @property
+    def staff(self):
+        return self._columns.string(self._get('staff'))
+
+    @property
+    def voice(self):
+        return self._columns.string(self._get('voice'))
+
+    @property
+    def onset(self):
+        return self._get('onset')
+
+class _SharedMeasureList:
+    """ the measures of one part; ScoreMeasure objects are built on access
+    around SharedNote views, so nothing is copied out of shared memory """
+
+    def __init__(self, columns, start, stop):
+        self._columns = columns
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def _getMeasure(self, index):
+        columns = self._columns
+        views = columns.views
+        descriptor = columns.descriptor
+        notes = [SharedNote(columns, i)
+                 for i in range(views['measure_note_start'][index], views['measure_note_stop'][index])]
+        return ScoreMeasure(views['measure_number'][index],
+                            descriptor.attributes[views['measure_attributes'][index]],
+                            columns.string(views['measure_tempo'][index]),
+                            (columns.string(views['measure_left_barline'][index]),
+                             columns.string(views['measure_right_barline'][index])),
+                            descriptor.navigations[views['measure_navigation'][index]],
+                            notes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._getMeasure(self._start + i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("measure index out of range")
+        return self._getMeasure(self._start + index)
+
+def _packColumns(score):
+    """ return (columns, lyrics, strings, attributes, navigations, part_ranges) of a Score """
+    columns = {'note_' + column: array(typecode) for column, typecode in NOTE_COLUMNS}
+    columns.update({'measure_' + column: array(typecode) for column, typecode in MEASURE_COLUMNS})
+    lyrics = bytearray()
+    tables = {'strings': {}, 'attributes': {}, 'navigations': {}}
+
+    def _index(table, value, key=None):
+        if value is None:
+            return -1
+        return tables[table].setdefault(value if key is None else key, (len(tables[table]), value))[0]
+
+    def _append(prefix, **values):
+        for column, value in values.items():
+            columns[prefix + column].append(value)
+
+    part_ranges = {}
+    measure_index = 0
+    for part in score.getPartIdList():
+        part_start = measure_index
+        for measure in score.iterMeasures(part):
+            note_start = len(columns['note_flags'])
+            for note in measure.notes:
+                lyric_start = lyric_stop = -1
+                if note.lyric is not None:
+                    lyric_start = len(lyrics)
+                    lyrics += note.lyric.encode('utf-8')
+                    lyric_stop = len(lyrics)
+                pitch, octave = note.pitch if note.pitch is not None else (None, 0)
+                actual_notes, normal_notes = note.tuplet_ratio or (0, 0)
+                _append('note_', attributes=_index('attributes', note.attributes, id(note.attributes)),
+                        pitch=_index('strings', pitch), octave=octave, duration=note.duration,
+                        tuplet_actual=actual_notes, tuplet_normal=normal_notes, flags=note.flags,
+                        staff=_index('strings', note.staff), voice=_index('strings', note.voice),
+                        onset=note.onset, lyric_start=lyric_start, lyric_stop=lyric_stop)
+            navigation = measure.navigation
+            _append('measure_', number=measure.number,
+                    attributes=_index('attributes', measure.attributes, id(measure.attributes)),
+                    tempo=_index('strings', measure.tempo),
+                    left_barline=_index('strings', measure.barlines[0]),
+                    right_barline=_index('strings', measure.barlines[1]),
+                    navigation=_index('navigations', navigation, tuple(sorted(navigation.items()))),
+                    note_start=note_start, note_stop=len(columns['note_flags']))
+            measure_index += 1
+        part_ranges[part] = (part_start, measure_index)
+
+    def _table(name):
+        return [value for index, value in sorted(tables[name].values(), key=lambda entry: entry[0])]
+
+    return (columns, lyrics, _table('strings'), _table('attributes'), _table('navigations'), part_ranges)
+
+_ATTACH_LOCK = threading.Lock()
+
+def _attachBlock(name):
+    """ open an existing block without handing it to the resource tracker,
+    which would otherwise unlink it when an attaching process exits """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+class SharedScore(Score):
+    """ a Score whose notes live in a multiprocessing.shared_memory block.
+
+    Pickling a SharedScore sends only its SharedScoreDescriptor; the
+    receiving process attaches to the block once and its writers read the
+    note columns in place. The creating process owns the block and must
+    call unlink() (or use the score as a context manager) when done.
+    """
+
+    def __init__(self, shm, descriptor, owner=False):
+        self._shm = shm
+        self._descriptor = descriptor
+        self._owner = owner
+        self._columns = _Columns(shm, descriptor)
+        part_measures = {part: _SharedMeasureList(self._columns, start, stop)
+                         for part, (start, stop) in descriptor.part_ranges.items()}
+        super().__init__(descriptor.title, descriptor.composer, descriptor.parts_details, part_measures)
+
+    @classmethod
+    def fromReader(cls, reader):
+        """ pack a reader (or a Score) into a new shared memory block """
+        score = reader if isinstance(reader, Score) else Score.fromReader(reader)
+        columns, lyrics, strings, attributes, navigations, part_ranges = _packColumns(score)
+        columns['lyrics'] = array('B', lyrics)
+
+        layout = {}
+        size = 0
+        for column, values in columns.items():
+            layout[column] = (size, values.typecode, len(values))
+            size += -(-len(values) * values.itemsize // ALIGNMENT) * ALIGNMENT
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for column, values in columns.items():
+            offset = layout[column][0]
+            shm.buf[offset:offset + len(values) * values.itemsize] = values.tobytes()
+
+        descriptor = SharedScoreDescriptor(shm.name, layout, strings, attributes, navigations,
+                                           score.getWorkTitle(), score.getComposer(),
+                                           score.getPartDetailsList(), part_ranges)
+        score = _ATTACHED[shm.name] = cls(shm, descriptor, owner=True)
+        return score
+
+    @classmethod
+    def attach(cls, descriptor):
+        """ open the block described by descriptor; attachments are reused
+        within a process """
+        score = _ATTACHED.get(descriptor.name)
+        if score is None:
+            shm = _attachBlock(descriptor.name)
+            score = _ATTACHED[descriptor.name] = cls(shm, descriptor)
+        return score
+
+    def getDescriptor(self):
+        return self._descriptor
+
+    def __reduce__(self):
+        return (SharedScore.attach, (self._descriptor,))
+
+    def close(self):
+        """ detach from the block; measures and notes read before are unusable afterwards """
+        if self._columns.views:
+            self._columns.release()
+            self._shm.close()
+        _ATTACHED.pop(self._descriptor.name, None)
+
+    def unlink(self):
+        """ close and free the block; only the owner unlinks """
+        self.close()
+        if self._owner:
+            self._shm.unlink()
+            self._owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+_ATTACHED = {} # block name -> SharedScore attached in this process
+
+def _generatePart(writer, score, part_index):
+    return writer.generate(score, part_index)
+
+def generatePartsShared(reader, writer, workers=2):
+    """ return [writer.generate(reader, i) for every byguitar part index],
+    rendering the parts in a process pool that reads one shared copy of the score """
+    with SharedScore.fromReader(reader) as score:
+        part_count = len(writer.getStaffParts(score)) if writer.split_voices else len(score.getPartIdList())
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_generatePart, writer, score, i) for i in range(part_count)]
+            return [future.result() for future in futures]
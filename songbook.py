@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+import logging
+
+from byguitar_writer import ByguitarWriter
+from conversion import iterOrdered
+from reader import MusicXMLReader
+from writer import Jianpu99Writer, WriterError
+
+logger = logging.getLogger(__name__)
+
+SONGBOOK_MODES = ('jcx', 'jianpu99')
+
+def renderSong(input_file, mode, tempo, number, unfold=False):
+    """ return one song of a songbook; runs in a worker process.
+
+    jcx songs start with an X: reference number, as tunes of a multi-tune
+    ABC file do; jianpu99 songs are the writer's header and body.
+    """
+    reader = MusicXMLReader(input_file)
+    if mode == 'jcx':
+        writer = ByguitarWriter(tempo, unfold=unfold)
+        return '\n'.join([f'X: {number}'] + list(writer.iter_jcx_lines(reader)))
+    elif mode == 'jianpu99':
+        writer = Jianpu99Writer(unfold=unfold)
+        return writer.generateHeader(reader) + writer.generate(reader)
+    else:
+        raise WriterError("mode cannot be used for a songbook: %s" % mode)
+
+def iterSongs(input_files, mode, tempo, workers=2, unfold=False):
+    """ yield (input file, song text or the exception raised) in the order of
+    input_files. With workers > 1 songs are rendered in a process pool; at
+    most 2 * workers rendered songs are held at a time """
+    if mode not in SONGBOOK_MODES:
+        raise WriterError("mode cannot be used for a songbook: %s" % mode)
+
+    jobs = ((input_file, (input_file, mode, tempo, number, unfold))
+            for number, input_file in enumerate(input_files, 1))
+    for input_file, get_song in iterOrdered(renderSong, jobs, workers):
+        try:
+            yield input_file, get_song()
+        except Exception as e:
+            yield input_file, e
+
+def writeSongbook(input_files, mode, tempo, stream, workers=2, unfold=False):
+    """ write the songs of input_files to a text stream as one document, a
+    blank line between songs, each song written as soon as it and the songs
+    before it are rendered. Songs that fail are left out; return a list of
+    (input file, exception) for them """
+    failed = []
+    written = 0
+    for input_file, song in iterSongs(input_files, mode, tempo, workers, unfold):
+        if isinstance(song, Exception):
+            logger.error("%s: conversion failed: %s: %s", input_file, type(song).__name__, song)
+            failed.append((input_file, song))
+            continue
+        if written:
+            stream.write('\n\n')
+        stream.write(song.rstrip('\n'))
+        stream.flush()
+        written += 1
+    if written:
+        stream.write('\n')
+    return failed
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import io
+import threading
+from reader import MusicXMLReader, MusicXMLParseError
+from conversion import renderOutputs, writeOutputs
+from async_converter import *
+
+def expectedLines(filename, mode):
+    stream = io.StringIO()
+    writeOutputs(MusicXMLReader(filename), mode, 0, stream)
+    return stream.getvalue().split('\n')[:-1]
+
+class TestAsyncConverter(TestCase):
+
+    def test_convert(self):
+        async def _convert():
+            with open('tests/case3.mxl', 'rb') as f:
+                data = f.read()
+            return await asyncio.gather(convert('tests/case1.musicxml', 'jianpu99'), convert(data, 'byguitar'))
+        jianpu99, byguitar = asyncio.run(_convert())
+        self.assertEqual(jianpu99, renderOutputs(MusicXMLReader('tests/case1.musicxml'), 'jianpu99', 0))
+        self.assertEqual(byguitar, renderOutputs(MusicXMLReader('tests/case3.mxl'), 'byguitar', 0))
+
+    def test_iterLines(self):
+        async def _lines(converter):
+            async with converter:
+                return [line async for line in converter.iterLines('tests/case2.musicxml', 'byguitar')]
+        expected = expectedLines('tests/case2.musicxml', 'byguitar')
+        self.assertEqual(asyncio.run(_lines(AsyncConverter(queue_size=1))), expected)
+        self.assertEqual(asyncio.run(_lines(AsyncConverter(ProcessPoolExecutor(max_workers=1)))), expected)
+
+    def test_abandonLines(self):
+        async def _firstLine(converter):
+            lines = converter.iterLines('tests/case1.musicxml', 'jianpu99')
+            line = await lines.__anext__()
+            await lines.aclose()
+            await asyncio.sleep(0.1)
+            return line, converter._semaphore.locked()
+        converter = AsyncConverter(max_in_flight=1, queue_size=1)
+        line, locked = asyncio.run(_firstLine(converter))
+        converter.close()
+        self.assertEqual(line, expectedLines('tests/case1.musicxml', 'jianpu99')[0])
+        self.assertFalse(locked)
+
+    def test_error(self):
+        async def _convert():
+            return await convert(b'<score-partwise><part>', 'jcx')
+        with self.assertRaises(MusicXMLParseError):
+            asyncio.run(_convert())
+
+    def test_boundedConcurrency(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def _work(*args):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            release.wait(5)
+            with lock:
+                running.pop()
+            return []
+
+        async def _convertAll(converter):
+            tasks = [asyncio.ensure_future(converter._run(None, _work)) for i in range(6)]
+            await asyncio.sleep(0.1)
+            release.set()
+            await asyncio.gather(*tasks)
+
+        converter = AsyncConverter(max_in_flight=2)
+        asyncio.run(_convertAll(converter))
+        converter.close()
+        self.assertEqual(max(peak), 2)
+
+    def test_timeoutKeepsSlot(self):
+        release = threading.Event()
+
+        async def _convert(converter):
+            with self.assertRaises(asyncio.TimeoutError):
+                await converter._run(0.05, release.wait, 5)
+            self.assertTrue(converter._semaphore.locked()) # the thread is still running
+            release.set()
+            await asyncio.sleep(0.1)
+            self.assertFalse(converter._semaphore.locked())
+
+        converter = AsyncConverter(max_in_flight=1)
+        asyncio.run(_convert(converter))
+        converter.close()
+
+    def test_limitsForTimeout(self):
+        self.assertEqual(limitsForTimeout(None, 3).time_budget, 3)
+        self.assertIsNone(limitsForTimeout(None, None).time_budget)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from reader import MusicXMLLimitError, MusicXMLReader, ReaderLimits
+from writer import Jianpu99Writer
+from bundle import *
+
+BUNDLE_MEMBERS = ['tests/case1.musicxml', 'tests/case3.mxl']
+
+class TestBundle(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _makeZip(self):
+        path = os.path.join(self.directory, 'bundle.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            for member in BUNDLE_MEMBERS:
+                archive.write(member, 'songs/' + os.path.basename(member))
+            archive.writestr('songs/readme.txt', 'not a score')
+        return path
+
+    def _makeTar(self):
+        path = os.path.join(self.directory, 'bundle.tar.gz')
+        with tarfile.open(path, 'w:gz') as archive:
+            for member in BUNDLE_MEMBERS:
+                archive.add(member, 'songs/' + os.path.basename(member))
+        return path
+
+    def test_isBundle(self):
+        self.assertTrue(isBundle(self._makeZip()))
+        self.assertTrue(isBundle(self._makeTar()))
+        self.assertFalse(isBundle('tests/case3.mxl'))
+        self.assertFalse(isBundle('tests/case1.musicxml'))
+
+    def test_readers(self):
+        expected = [Jianpu99Writer().generate(MusicXMLReader(member)) for member in BUNDLE_MEMBERS]
+        for path in (self._makeZip(), self._makeTar()):
+            names, outputs = [], []
+            for name, reader in iterBundleReaders(path):
+                names.append(name)
+                outputs.append(Jianpu99Writer().generate(reader))
+            self.assertEqual(names, ['songs/case1.musicxml', 'songs/case3.mxl'])
+            self.assertEqual(outputs, expected)
+
+    def test_convertBundle(self):
+        output_dir = os.path.join(self.directory, 'out')
+        for workers in (1, 2):
+            results = convertBundle(self._makeTar(), 'jianpu99', 0, output_dir, workers)
+            self.assertEqual([name for name, outputs in results], ['songs/case1.musicxml', 'songs/case3.mxl'])
+            with open(os.path.join(output_dir, 'songs', 'case3.txt')) as f:
+                self.assertEqual(f.read(), Jianpu99Writer().generate(MusicXMLReader('tests/case3.mxl')))
+
+    def test_oversizedMember(self):
+        with open('tests/case1.musicxml', 'rb') as f:
+            data = f.read()
+        limits = ReaderLimits(max_bytes=len(data) + 100)
+        big_file = os.path.join(self.directory, 'big.musicxml')
+        with open(big_file, 'wb') as f:
+            f.write(data + b' ' * 100000) # compresses below the limit
+        zip_path = os.path.join(self.directory, 'big.zip')
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.write(big_file, 'big.musicxml')
+            archive.write('tests/case1.musicxml', 'small.musicxml')
+        tar_path = os.path.join(self.directory, 'big.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as archive:
+            archive.add(big_file, 'big.musicxml')
+            archive.add('tests/case1.musicxml', 'small.musicxml')
+        for path in (zip_path, tar_path):
+            output_dir = os.path.join(self.directory, 'out')
+            results = convertBundle(path, 'jianpu99', 0, output_dir, limits=limits)
+            self.assertEqual([(name, type(outputs)) for name, outputs in results],
+                             [('big.musicxml', MusicXMLLimitError), ('small.musicxml', list)])
+            self.assertFalse(os.path.exists(os.path.join(output_dir, 'big.txt')))
+            shutil.rmtree(output_dir)
+
+    def test_memberOutsideOutputDir(self):
+        path = os.path.join(self.directory, 'evil.zip')
+        with open('tests/case3.mxl', 'rb') as f:
+            data = f.read()
+        with zipfile.ZipFile(path, 'w') as archive:
+            # ZipInfo keeps names as given, unlike ZipFile.write
+            for name in ('../escaped.mxl', '/tmp/absolute.mxl', 'songs/../../escaped2.mxl', 'songs/../inside.mxl'):
+                archive.writestr(zipfile.ZipInfo(name), data)
+        output_dir = os.path.join(self.directory, 'out')
+        results = convertBundle(path, 'jianpu99', 0, output_dir)
+        self.assertEqual([type(outputs) for name, outputs in results],
+                         [BundleError, BundleError, BundleError, list])
+        self.assertEqual(results[3][1], [os.path.join(os.path.realpath(output_dir), 'inside.txt')])
+        self.assertEqual(sorted(os.listdir(self.directory)), ['evil.zip', 'out'])
+        self.assertFalse(os.path.exists('/tmp/absolute.txt'))
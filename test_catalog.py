@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+from catalog import *
+
+class TestCatalog(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.db_path = os.path.join(self.directory, 'catalog.db')
+        self.files = []
+        for case in ('case1.musicxml', 'case3.mxl'):
+            path = os.path.join(self.directory, case)
+            shutil.copy(os.path.join('tests', case), path)
+            self.files.append(path)
+
+    def test_export(self):
+        stats = exportCatalog(self.files, self.db_path, tempo='100', batch_size=1)
+        self.assertEqual(stats, {'converted': 2, 'skipped': 0, 'failed': 0})
+
+        connection = openCatalog(self.db_path)
+        rows = connection.execute("SELECT title, key_signature, time_signature FROM scores ORDER BY path").fetchall()
+        self.assertEqual(rows, [('Test Title', 'C', '4/4'), ('いつも何度でも', 'C', '3/4')])
+        outputs = connection.execute("SELECT mode, name FROM outputs WHERE path = ? ORDER BY mode, name",
+                                     (self.files[0],)).fetchall()
+        self.assertEqual(outputs, [('byguitar', '-0.txt'), ('byguitar', '-1.txt'),
+                                   ('jcx', '.jcx'), ('jianpu99', '.txt')])
+        connection.close()
+
+    def test_rerunSkipsUnchanged(self):
+        exportCatalog(self.files, self.db_path, tempo='100')
+        stats = exportCatalog(self.files, self.db_path, tempo='100')
+        self.assertEqual(stats, {'converted': 0, 'skipped': 2, 'failed': 0})
+
+        shutil.copy('tests/case2.musicxml', self.files[0])
+        stats = exportCatalog(self.files, self.db_path, tempo='100', workers=2)
+        self.assertEqual(stats, {'converted': 1, 'skipped': 1, 'failed': 0})
+        connection = openCatalog(self.db_path)
+        self.assertEqual(connection.execute("SELECT title FROM scores WHERE path = ?", (self.files[0],)).fetchone(),
+                         ('test',))
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM outputs WHERE path = ?", (self.files[0],)).fetchone(),
+                         (4,))
+        connection.close()
+
+    def test_unreadableFile(self):
+        missing = os.path.join(self.directory, 'missing.musicxml')
+        with self.assertLogs('catalog', 'ERROR'):
+            stats = exportCatalog([self.files[0], missing, self.files[1]], self.db_path, tempo='100', batch_size=2)
+        self.assertEqual(stats, {'converted': 2, 'skipped': 0, 'failed': 1})
+        connection = openCatalog(self.db_path)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM scores").fetchone(), (2,))
+        connection.close()
+
+    def test_rerunWithOtherParameters(self):
+        exportCatalog(self.files, self.db_path, tempo='100')
+        stats = exportCatalog(self.files, self.db_path, tempo='120')
+        self.assertEqual(stats, {'converted': 2, 'skipped': 0, 'failed': 0})
+        stats = exportCatalog(self.files, self.db_path, modes=('jcx',), tempo='120')
+        self.assertEqual(stats, {'converted': 2, 'skipped': 0, 'failed': 0})
+        connection = openCatalog(self.db_path)
+        self.assertEqual(connection.execute("SELECT DISTINCT mode FROM outputs").fetchall(), [('jcx',)])
+        connection.close()
+        self.assertEqual(exportCatalog(self.files, self.db_path, modes=('jcx',), tempo='120')['skipped'], 2)
+
+    def test_catalogWithoutRenderKeys(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("CREATE TABLE scores (path TEXT PRIMARY KEY, content_hash TEXT NOT NULL, title TEXT, "
+                           "composer TEXT, key_signature TEXT, time_signature TEXT, tempo TEXT, parts TEXT, updated REAL)")
+        connection.close()
+        self.assertEqual(exportCatalog(self.files, self.db_path, tempo='100')['converted'], 2)
+        self.assertEqual(exportCatalog(self.files, self.db_path, tempo='100')['skipped'], 2)
+
+    def test_soundWithoutTempo(self):
+        from test_reader import FAKE_ATTRIBUTES, makeFakeNote, makeFakeScore
+        path = os.path.join(self.directory, 'dynamics.musicxml')
+        with open(path, 'wb') as f:
+            f.write(makeFakeScore(['<measure number="1">%s<direction><sound dynamics="80"/></direction>%s</measure>' % (
+                FAKE_ATTRIBUTES, makeFakeNote('C', 8, '1'))]))
+        stats = exportCatalog([path], self.db_path, tempo='100')
+        self.assertEqual(stats, {'converted': 1, 'skipped': 0, 'failed': 0})
+        connection = openCatalog(self.db_path)
+        self.assertEqual(connection.execute("SELECT tempo FROM scores WHERE path = ?", (path,)).fetchone(), (None,))
+        connection.close()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+from reader import MusicXMLReader, LazyMusicXMLReader
+from writer import Jianpu99Writer, MeasureCache
+from byguitar_writer import ByguitarWriter
+
+class TestSharedReader(TestCase):
+    """ renders from one reader and one set of writers on many threads
+    must match the serial renders """
+
+    FILENAMES = ('tests/case1.musicxml', 'tests/case3.mxl')
+    THREADS = 8
+    ROUNDS = 8
+
+    def getJobs(self, reader, measure_cache):
+        jianpu99 = Jianpu99Writer(measure_cache)
+        byguitar = ByguitarWriter('90', measure_cache)
+        jobs = [lambda: jianpu99.generate(reader),
+                lambda: jianpu99.withTargetKey('G').generate(reader),
+                lambda: byguitar.generate_jcx(reader),
+                lambda: byguitar.generate_jcx_for_keys(reader, ['C', 'F'])]
+        jobs += [lambda i=i: byguitar.generate(reader, i) for i in range(len(byguitar.getStaffParts(reader)))]
+        return jobs
+
+    def assertConcurrentMatchesSerial(self, filename, reader, measure_cache):
+        expected = [job() for job in self.getJobs(MusicXMLReader(filename), MeasureCache())]
+        jobs = self.getJobs(reader, measure_cache) * self.ROUNDS
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            outputs = list(executor.map(lambda job: job(), jobs))
+        self.assertEqual(outputs, expected * self.ROUNDS)
+
+    def test_reader(self):
+        for filename in self.FILENAMES:
+            self.assertConcurrentMatchesSerial(filename, MusicXMLReader(filename), MeasureCache())
+
+    def test_lazyReader(self):
+        for filename in self.FILENAMES:
+            self.assertConcurrentMatchesSerial(filename, LazyMusicXMLReader(filename), MeasureCache())
+
+    def test_persistentMeasureCache(self):
+        from measure_store import PersistentMeasureCache
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with PersistentMeasureCache(os.path.join(directory, 'measures.db'), flush_every=16) as cache:
+            filename = self.FILENAMES[0]
+            self.assertConcurrentMatchesSerial(filename, MusicXMLReader(filename), cache)
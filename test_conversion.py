@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+from conversion import *
+
+def _square(value):
+    if value < 0:
+        raise ValueError(value)
+    return value * value
+
+class TestConversion(TestCase):
+
+    def test_writeOutputFiles(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        input_file = os.path.join(temp_dir, 'song.musicxml')
+        filenames = writeOutputFiles(input_file, [('-0.txt', 'a'), ('.jcx', 'b')])
+        self.assertEqual(filenames, [os.path.join(temp_dir, 'song-0.txt'), os.path.join(temp_dir, 'song.jcx')])
+        with open(filenames[1]) as f:
+            self.assertEqual(f.read(), 'b')
+
+    def test_release(self):
+        from reader import MusicXMLReader
+        note_count = MusicXMLReader('tests/case3.mxl').getNoteCount('P1')
+        for mode in ('jcx', 'byguitar', 'jianpu99'):
+            for split_voices in (False, True):
+                reader = MusicXMLReader('tests/case3.mxl')
+                released = renderOutputs(reader, mode, 90, split_voices=split_voices, release=True)
+                self.assertEqual(released, renderOutputs(MusicXMLReader('tests/case3.mxl'), mode, 90,
+                                                         split_voices=split_voices))
+                # all but the last window of measures are freed
+                self.assertLess(reader.getNoteCount('P1'), note_count / 4)
+
+    def test_iterSubmitted(self):
+        submitted = []
+        def _record(value):
+            submitted.append(value)
+            return value
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            jobs = ((i, (i,)) for i in range(5))
+            for i, (key, future) in enumerate(iterSubmitted(executor, _record, jobs, 2)):
+                self.assertEqual((key, future.result()), (i, i))
+                self.assertLessEqual(len(submitted), i + 2) # never more than depth ahead
+
+    def test_iterOrdered(self):
+        jobs = [(value, (value,)) for value in (3, -1, 2, 5)]
+        for workers in (1, 2):
+            results = []
+            for key, get_result in iterOrdered(_square, jobs, workers):
+                try:
+                    results.append((key, get_result()))
+                except ValueError:
+                    results.append((key, None))
+            self.assertEqual(results, [(3, 9), (-1, None), (2, 4), (5, 25)])
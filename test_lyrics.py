@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from lyrics import *
+from test_reader import FAKE_ATTRIBUTES, makeFakeNote, makeFakeScore
+
+def makeLyricNote(step, lyrics, staff=None):
+    elems = ''.join('<lyric number="%s"><syllabic>%s</syllabic><text>%s</text></lyric>' % lyric for lyric in lyrics)
+    return makeFakeNote(step, 4, '1', staff).replace('</note>', elems + '</note>')
+
+class TestLyrics(TestCase):
+
+    def setUp(self):
+        self.data = makeFakeScore([
+            '<measure number="1">%s%s%s</measure>' % (
+                FAKE_ATTRIBUTES,
+                makeLyricNote('C', [('1', 'begin', 'hel'), ('2', 'single', 'good')]),
+                makeLyricNote('D', [('1', 'end', 'lo'), ('2', 'single', 'bye')])),
+            '<measure number="2">%s%s</measure>' % (
+                makeLyricNote('E', [('1', 'single', 'world')]),
+                makeFakeNote('F', 4, '1'))])
+
+    def test_iterSyllables(self):
+        self.assertEqual(list(iterSyllables(self.data))[:2],
+                         [('P1', None, '1', 'hel-'), ('P1', None, '2', 'good')])
+
+    def test_extractLyrics(self):
+        self.assertEqual(extractLyrics(self.data), {'P1': {(None, '1'): 'hel-lo world', (None, '2'): 'good bye'}})
+
+    def test_partWithoutLyrics(self):
+        self.assertEqual(renderLyrics('tests/case1.musicxml'), [('-0.lyrics.txt', ''), ('-1.lyrics.txt', '')])
+
+    def test_joinSyllables(self):
+        self.assertEqual(joinSyllables(['a-', 'b-', 'c', 'd']), 'a-b-c d')
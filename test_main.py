@@ -3,6 +3,23 @@
 import unittest
 from test_reader import *
 from test_writer import *
+from test_watcher import *
+from test_score import *
+from test_bundle import *
+from test_catalog import *
+from test_unfold import *
+from test_sharding import *
+from test_shared_score import *
+from test_async_converter import *
+from test_preflight import *
+from test_lyrics import *
+from test_measure_store import *
+from test_metrics import *
+from test_timeline import *
+from test_concurrency import *
+from test_pipeline import *
+from test_songbook import *
+from test_conversion import *
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import os
+import shutil
+import sys
+import tempfile
+from measure_store import *
+
+class TestPersistentMeasureCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.db_path = os.path.join(self.directory, 'measures.db')
+
+    def test_get(self):
+        with PersistentMeasureCache(self.db_path) as cache:
+            self.assertEqual(cache.get('a', lambda: ("1", " ", "2")), ("1", " ", "2"))
+            self.assertEqual(cache.get('a', lambda: ("changed",)), ("1", " ", "2"))
+            self.assertEqual((cache.hits, cache.store_hits, cache.misses), (1, 0, 1))
+
+        with PersistentMeasureCache(self.db_path) as cache:
+            self.assertEqual(cache.get('a', lambda: ("changed",)), ("1", " ", "2"))
+            self.assertEqual((cache.hits, cache.store_hits, cache.misses), (1, 1, 0))
+
+    def test_evictLeastRecentlyUsed(self):
+        with PersistentMeasureCache(self.db_path, max_entries=2, flush_every=1) as cache:
+            cache.get('a', lambda: ("1",))
+            cache.get('b', lambda: ("2",))
+            cache._entries.clear()
+            cache.get('a', lambda: ("1",)) # a is now used after b
+            cache.get('c', lambda: ("3",))
+            self.assertEqual(cache.evictions, 1)
+
+        with PersistentMeasureCache(self.db_path) as cache:
+            self.assertEqual(cache.get('a', lambda: ("new",)), ("1",))
+            self.assertEqual(cache.get('c', lambda: ("new",)), ("3",))
+            self.assertEqual(cache.get('b', lambda: ("new",)), ("new",))
+
+    def test_reuseAcrossRuns(self):
+        from reader import MusicXMLReader
+        from writer import Jianpu99Writer
+        reader = MusicXMLReader('tests/case3.mxl')
+        with PersistentMeasureCache(self.db_path) as cache:
+            output = Jianpu99Writer(cache).generate(reader)
+
+        with PersistentMeasureCache(self.db_path) as cache:
+            self.assertEqual(Jianpu99Writer(cache).generate(reader), output)
+            self.assertEqual(cache.misses, 0)
+            self.assertGreater(cache.store_hits, 0)
+
+            # another render version renders every measure again
+            class NewJianpu99Writer(Jianpu99Writer):
+                RENDER_VERSION = Jianpu99Writer.RENDER_VERSION + 1
+            cache.hits = cache.misses = 0
+            cache._entries.clear()
+            self.assertEqual(NewJianpu99Writer(cache).generate(reader), output)
+            self.assertGreater(cache.misses, 0)
+
+    def test_sourceChangeRendersAgain(self):
+        import importlib.util
+        from reader import MusicXMLReader
+        reader = MusicXMLReader('tests/case3.mxl')
+
+        def _loadWriter(source):
+            # a writer module edited between runs
+            filename = os.path.join(self.directory, 'local_writer.py')
+            with open(filename, 'w') as f:
+                f.write(source)
+            spec = importlib.util.spec_from_file_location('local_writer', filename)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules['local_writer'] = module # as import does
+            self.addCleanup(sys.modules.pop, 'local_writer', None)
+            spec.loader.exec_module(module)
+            return module.LocalWriter
+
+        source = "from writer import Jianpu99Writer\nclass LocalWriter(Jianpu99Writer):\n    pass\n"
+        with PersistentMeasureCache(self.db_path) as cache:
+            output = _loadWriter(source)(cache).generate(reader)
+        with PersistentMeasureCache(self.db_path) as cache:
+            self.assertEqual(_loadWriter(source)(cache).generate(reader), output)
+            self.assertEqual(cache.misses, 0)
+        with PersistentMeasureCache(self.db_path) as cache:
+            changed = _loadWriter(source.replace("pass", "REST = 'x'"))(cache).generate(reader)
+            self.assertEqual(cache.store_hits, 0)
+            self.assertNotEqual(changed, output)
+
+    def test_dependencyChangeRendersAgain(self):
+        import importlib.util
+        from writer import getSourceDigest
+
+        def _loadModule(name, source):
+            filename = os.path.join(self.directory, name + '.py')
+            with open(filename, 'w') as f:
+                f.write(source)
+            spec = importlib.util.spec_from_file_location(name, filename)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            self.addCleanup(sys.modules.pop, name, None)
+            spec.loader.exec_module(module)
+            return module
+
+        def _digest(helper_source):
+            _loadModule('local_helper', helper_source)
+            writer = _loadModule('local_writer', "from writer import Jianpu99Writer\n"
+                                 "from local_helper import helper\n"
+                                 "class LocalWriter(Jianpu99Writer):\n"
+                                 "    RENDER_DEPENDENCIES = (helper,)\n").LocalWriter
+            return getSourceDigest(writer)
+
+        self.assertNotEqual(_digest("def helper():\n    return 1\n"), _digest("def helper():\n    return 2\n"))
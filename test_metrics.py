@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+from metrics import *
+
+class TestHistogram(TestCase):
+
+    def test_observe(self):
+        histogram = Histogram((1, 2, 4))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(list(histogram.iterCumulative()),
+                         [('1.0', 2), ('2.0', 3), ('4.0', 4), ('+Inf', 5)])
+        self.assertEqual((histogram.count, histogram.sum), (5, 16))
+
+    def test_quantile(self):
+        histogram = Histogram((1, 2, 4))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 1.5, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(0.99), 3.92)
+
+class TestConversionMetrics(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.input_file = os.path.join(self.directory, 'case3.mxl')
+        shutil.copy('tests/case3.mxl', self.input_file)
+
+    def test_prometheus(self):
+        from converter import convertFile
+        from reader import MusicXMLParseError
+        path = os.path.join(self.directory, 'metrics.prom')
+        metrics = ConversionMetrics(path)
+        convertFile(self.input_file, 'jianpu99', 0, metrics=metrics)
+        bad_file = os.path.join(self.directory, 'bad.musicxml')
+        with open(bad_file, 'w') as f:
+            f.write('<score-partwise')
+        with self.assertRaises(MusicXMLParseError):
+            convertFile(bad_file, 'jianpu99', 0, metrics=metrics)
+        metrics.close()
+
+        with open(path) as f:
+            text = f.read()
+        self.assertIn('musicxml_conversion_files_total 2\n', text)
+        self.assertIn('musicxml_conversion_errors_total{type="MusicXMLParseError"} 1\n', text)
+        self.assertIn('musicxml_conversion_measures_total 34\n', text)
+        self.assertIn('musicxml_conversion_parse_seconds_bucket{le="+Inf"} 2\n', text)
+        self.assertIn('musicxml_conversion_render_seconds_count 1\n', text)
+
+    def test_concurrentWrites(self):
+        import threading
+        path = os.path.join(self.directory, 'metrics.prom')
+        metrics = ConversionMetrics(path)
+        errors = []
+        def write():
+            try:
+                for i in range(50):
+                    metrics.write()
+            except OSError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=write) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertFalse(os.path.exists(path + '.tmp'))
+        with open(path) as f:
+            self.assertIn('musicxml_conversion_files_total 0\n', f.read())
+
+    def test_jsonl(self):
+        from converter import convertFile
+        path = os.path.join(self.directory, 'metrics.jsonl')
+        metrics = ConversionMetrics(path, 'jsonl')
+        convertFile(self.input_file, 'byguitar', 0, metrics=metrics)
+        metrics.close()
+
+        with open(path) as f:
+            record, summary = [json.loads(line) for line in f]
+        self.assertEqual(record['file'], self.input_file)
+        self.assertEqual((record['measures'], record['notes'], record['error']), (34, 127, None))
+        self.assertGreater(record['output_bytes'], 0)
+        self.assertLessEqual(record['parse_seconds'] + record['render_seconds'], record['seconds'])
+        self.assertTrue(summary['summary'])
+        self.assertEqual(summary['files'], 1)
+        self.assertIsNotNone(summary['p99_seconds'])
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+from reader import MusicXMLParseError
+from pipeline import *
+
+class TestPipeline(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.files = []
+        for case in ('case1.musicxml', 'case3.mxl', 'bad.musicxml', 'case4.mxl', 'case5.musicxml'):
+            path = os.path.join(self.directory, case)
+            if case == 'bad.musicxml':
+                with open(path, 'w') as f:
+                    f.write('<score-partwise')
+            else:
+                shutil.copy(os.path.join('tests', case), path)
+            self.files.append(path)
+
+    def test_readSource(self):
+        from reader import readCompressedMusicXML
+        self.assertEqual(readSource(self.files[1]), readCompressedMusicXML(self.files[1]))
+        with open(self.files[0], 'rb') as f:
+            self.assertEqual(readSource(self.files[0]), f.read())
+
+    def test_prefetchDepth(self):
+        submitted = []
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            class CountingExecutor:
+                def submit(self, function, input_file, limits):
+                    submitted.append(input_file)
+                    return executor.submit(function, input_file, limits)
+
+            for i, (input_file, future) in enumerate(iterPrefetched(self.files, CountingExecutor(), 2)):
+                self.assertEqual(input_file, self.files[i])
+                self.assertLessEqual(len(submitted), i + 2)
+
+    def test_matchesConvertFile(self):
+        from converter import convertFile
+        for mode in ('jianpu99', 'byguitar', 'jcx'):
+            results = convertPipelined(self.files, mode, '90', prefetch_workers=2, queue_depth=2)
+            self.assertEqual([input_file for input_file, outputs in results], self.files)
+            self.assertIsInstance(results[2][1], MusicXMLParseError)
+
+            pipelined = {}
+            for input_file, output_filenames in results:
+                if input_file != self.files[2]:
+                    for output_filename in output_filenames:
+                        with open(output_filename) as f:
+                            pipelined[output_filename] = f.read()
+            for input_file in self.files[:2] + self.files[3:]:
+                for output_filename in convertFile(input_file, mode, '90'):
+                    with open(output_filename) as f:
+                        self.assertEqual(pipelined.pop(output_filename), f.read())
+            self.assertEqual(pipelined, {})
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from reader import MusicXMLReader, MusicXMLParseError
+from preflight import *
+from test_reader import FAKE_ATTRIBUTES, makeFakeNote, makeFakeScore
+
+class TestPreflight(TestCase):
+
+    def test_matchesReader(self):
+        for filename in ('tests/case1.musicxml', 'tests/case3.mxl'):
+            reader = MusicXMLReader(filename)
+            profile = preflight(filename)
+            self.assertEqual(profile['part_count'], len(reader.getPartIdList()))
+            self.assertEqual([part['measures'] for part in profile['parts']],
+                             [reader.getMeasureCount(part) for part in reader.getPartIdList()])
+            self.assertEqual(profile['notes'], sum(len(measure.getNotes())
+                                                   for part in reader.getPartIdList()
+                                                   for measure in reader.iterMeasures(part)))
+            self.assertEqual(profile['parts'][0]['initial_tempo'], reader.getInitialTempo())
+            self.assertEqual(profile['issues'], [])
+
+    def test_issues(self):
+        data = makeFakeScore([
+            '<measure number="1">%s%s<backup><duration>4</duration></backup>%s</measure>' % (
+                FAKE_ATTRIBUTES, makeFakeNote('C', 4, '1'), makeFakeNote('D', 4, '2')),
+            '<measure number="2"><attributes><key><fifths>2</fifths></key></attributes>%s</measure>' % (
+                makeFakeNote('E', 8, '1'))])
+        profile = preflight(data)
+        part = profile['parts'][0]
+        self.assertEqual((part['measures'], part['notes'], part['voices'], part['backups'], part['key_changes']),
+                         (2, 3, 2, 1, 1))
+        self.assertEqual(len(profile['issues']), 4)
+        self.assertIn("no tempo in the first measure", profile['issues'])
+
+    def test_firstSoundWithoutTempo(self):
+        data = makeFakeScore(['<measure number="1">%s%s%s%s</measure>' % (
+            FAKE_ATTRIBUTES, '<direction><sound dynamics="80"/></direction>',
+            '<direction><sound tempo="100"/></direction>', makeFakeNote('C', 8, '1'))])
+        with self.assertRaises(KeyError): # what the converter runs into
+            MusicXMLReader.fromBytes(data).getInitialTempo()
+        profile = preflight(data)
+        self.assertIsNone(profile['parts'][0]['initial_tempo'])
+        self.assertEqual(profile['parts'][0]['tempo_changes'], 1)
+        self.assertIn("no tempo in the first measure", profile['issues'])
+
+    def test_timewise(self):
+        profile = preflight(b'<score-timewise><measure number="1"><part id="P1"/></measure></score-timewise>')
+        self.assertEqual(profile['part_count'], 0)
+        self.assertIn("unsupported root element: score-timewise", profile['issues'])
+
+    def test_malformed(self):
+        with self.assertRaises(MusicXMLParseError):
+            preflight(b'<score-partwise><part>')
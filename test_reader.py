@@ -3,6 +3,8 @@
 from unittest import TestCase
 from unittest.mock import patch
 from lxml import etree
+import os
+import tempfile
 from reader import *
 
 class TestMeasure(TestCase):
@@ -316,6 +318,196 @@ class TestNote(TestCase):
 
 # ------------- TEST DATA -------------
 
+def writeFakeScore(testcase, content):
+    fd, path = tempfile.mkstemp(suffix='.musicxml')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    testcase.addCleanup(os.remove, path)
+    return path
+
+class TestReaderLimits(TestCase):
+
+    def test_entitiesNotExpanded(self):
+        path = writeFakeScore(self, makeFakeScore(doctype='<!DOCTYPE score-partwise [<!ENTITY title "expanded">]>',
+                                                  title='&title;'))
+        reader = MusicXMLReader(path)
+        self.assertNotEqual(reader.getWorkTitle(), "expanded")
+
+    def test_externalDtdNotLoaded(self):
+        path = writeFakeScore(self, makeFakeScore(
+            doctype='<!DOCTYPE score-partwise SYSTEM "file:///nonexistent/partwise.dtd">', title='T'))
+        reader = MusicXMLReader(path)
+        self.assertEqual(reader.getWorkTitle(), "T")
+
+    def test_maxBytes(self):
+        path = writeFakeScore(self, makeFakeScore())
+        with self.assertRaises(MusicXMLLimitError):
+            MusicXMLReader(path, ReaderLimits(max_bytes=100))
+
+    def test_maxMeasures(self):
+        path = writeFakeScore(self, makeFakeScore(makeFakeMeasures(5)))
+        self.assertEqual(len(list(MusicXMLReader(path).iterMeasures('P1'))), 5)
+        with self.assertRaises(MusicXMLLimitError):
+            MusicXMLReader(path, ReaderLimits(max_measures=4))
+
+    def test_maxDepth(self):
+        path = writeFakeScore(self, makeFakeScore())
+        with self.assertRaises(MusicXMLLimitError):
+            MusicXMLReader(path, ReaderLimits(max_depth=3))
+
+    def test_timeBudget(self):
+        path = writeFakeScore(self, makeFakeScore(makeFakeMeasures(2)))
+        reader = MusicXMLReader(path, ReaderLimits(time_budget=-1))
+        with self.assertRaises(MusicXMLLimitError):
+            list(reader.iterMeasures('P1'))
+
+class TestMeasureWindows(TestCase):
+
+    def setUp(self):
+        self.reader = MusicXMLReader(writeFakeScore(self, makeFakeScore(makeFakeMeasures(5))))
+
+    def test_windows(self):
+        windows = list(self.reader.iterMeasureWindows('P1', 2))
+        self.assertEqual([[m.getMeasureNumber() for m in w] for w in windows], [[1, 2], [3, 4], [5]])
+        # attributes are carried forward without a reference to the previous measure
+        self.assertEqual(windows[2][0].getAttributes().getDivisions(), 2)
+        self.assertEqual(self.reader.getMeasureCount('P1'), 5)
+
+    def test_release(self):
+        windows = self.reader.iterMeasureWindows('P1', 2, release=True)
+        first = next(windows)
+        self.assertEqual(first[0].getMeasureNumber(), 1)
+        next(windows)
+        self.assertEqual(len(first[0]._elem), 0)
+
+class TestReaderInput(TestCase):
+
+    def test_fromBytes(self):
+        for filename in ('tests/case1.musicxml', 'tests/case3.mxl'):
+            with open(filename, 'rb') as f:
+                reader = MusicXMLReader.fromBytes(f.read())
+            self.assertEqual(reader.getWorkTitle(), MusicXMLReader(filename).getWorkTitle())
+
+    def test_open(self):
+        with open('tests/case3.mxl', 'rb') as f:
+            data = f.read()
+        for source in ('tests/case3.mxl', data, bytearray(data)):
+            self.assertEqual(MusicXMLReader.open(source).getWorkTitle(), MusicXMLReader('tests/case3.mxl').getWorkTitle())
+        self.assertIsInstance(LazyMusicXMLReader.open(data), LazyMusicXMLReader)
+
+    def test_fromFile(self):
+        with open('tests/case3.mxl', 'rb') as f:
+            reader = MusicXMLReader.fromFile(f)
+        self.assertEqual(reader.getInitialTimeSignature(), '3/4')
+        with open('tests/case1.musicxml', 'rb') as f:
+            with self.assertRaises(MusicXMLLimitError):
+                MusicXMLReader.fromFile(f, ReaderLimits(max_bytes=1000))
+
+    def test_malformed(self):
+        with self.assertRaises(MusicXMLParseError):
+            MusicXMLReader.fromBytes(b'<score-partwise><part>')
+        with self.assertRaises(MusicXMLParseError):
+            MusicXMLReader.fromBytes(b'PK\x03\x04 not really a zip')
+
+class TestLazyReader(TestCase):
+
+    def test_sameOutput(self):
+        from writer import Jianpu99Writer
+        from byguitar_writer import ByguitarWriter
+        for filename in ('tests/case1.musicxml', 'tests/case2.musicxml', 'tests/case3.mxl'):
+            reader = MusicXMLReader(filename)
+            self.assertEqual(Jianpu99Writer().generate(LazyMusicXMLReader(filename)), Jianpu99Writer().generate(reader))
+            self.assertEqual(ByguitarWriter('90').generate_jcx(LazyMusicXMLReader(filename)),
+                             ByguitarWriter('90').generate_jcx(reader))
+
+    def test_onlyRequestedPartParsed(self):
+        from byguitar_writer import ByguitarWriter
+        reader = LazyMusicXMLReader('tests/case1.musicxml')
+        self.assertEqual(reader.getWorkTitle(), MusicXMLReader('tests/case1.musicxml').getWorkTitle())
+        self.assertEqual(reader.getMeasureCount('P2'), MusicXMLReader('tests/case1.musicxml').getMeasureCount('P2'))
+        output = ByguitarWriter(0).generate(reader, 1)
+        self.assertEqual(output, ByguitarWriter(0).generate(MusicXMLReader('tests/case1.musicxml'), 1))
+        self.assertFalse(reader.isPartLoaded('P1'))
+        self.assertTrue(reader.isPartLoaded('P2'))
+
+    def test_limits(self):
+        with self.assertRaises(MusicXMLLimitError):
+            LazyMusicXMLReader.fromBytes(makeFakeScore(makeFakeMeasures(3)), ReaderLimits(max_measures=2))
+
+    def test_fallback(self):
+        content = makeFakeScore(makeFakeMeasures(2)).decode().replace('<?xml version="1.0"?>', '')
+        reader = LazyMusicXMLReader.fromBytes(content.encode('utf-16'))
+        self.assertFalse(reader._part_spans)
+        self.assertEqual(reader.getMeasureCount('P1'), 2)
+
+def makeFakeNote(step, duration, voice, staff=None, chord=False):
+    return "<note>%s<pitch><step>%s</step><octave>4</octave></pitch><duration>%d</duration><voice>%s</voice>%s</note>" % (
+        '<chord/>' if chord else '', step, duration, voice, '<staff>%s</staff>' % staff if staff else '')
+
+class TestVoiceStreams(TestCase):
+
+    def setUp(self):
+        self.measure = Measure(etree.fromstring('<measure number="1">%s%s%s%s%s%s%s%s</measure>' % (
+            FAKE_ATTRIBUTES,
+            makeFakeNote('C', 4, '1'), makeFakeNote('E', 4, '1', chord=True), makeFakeNote('D', 4, '1'),
+            '<backup><duration>8</duration></backup>',
+            makeFakeNote('G', 2, '2'),
+            '<forward><duration>2</duration></forward>',
+            makeFakeNote('A', 4, '2'))))
+
+    def test_streams(self):
+        streams = self.measure.getVoiceStreams()
+        self.assertEqual(list(streams.keys()), [(None, '1'), (None, '2')])
+        self.assertEqual([(onset, n.getPitch()[0]) for onset, n in streams[(None, '1')]],
+                         [(0, 'C'), (0, 'E'), (4, 'D')])
+        self.assertEqual([(onset, n.getPitch()[0]) for onset, n in streams[(None, '2')]],
+                         [(0, 'G'), (4, 'A')])
+
+    def test_cloneOnlyVoice(self):
+        voice2 = self.measure.cloneOnlyStaff(None, '2')
+        self.assertEqual([n.getPitch()[0] for n in voice2], ['G', 'A'])
+        self.assertIs(voice2.getVoiceStreams()[(None, '2')], self.measure.getVoiceStreams()[(None, '2')])
+        self.assertNotEqual(voice2.getFingerprint(), self.measure.getFingerprint())
+
+    def test_noteFingerprint(self):
+        def fingerprint(extra):
+            return Note(etree.fromstring(
+                '<note default-x="%d"><pitch><step>C</step><octave>4</octave></pitch><duration>2</duration>%s</note>'
+                % (len(extra), extra)), None).getFingerprint()
+        plain = fingerprint('')
+        self.assertEqual(fingerprint('<stem>up</stem><lyric><text>la</text></lyric>'), plain)
+        self.assertEqual(fingerprint('<notations><slur type="start"/></notations>'), plain)
+        self.assertNotEqual(fingerprint('<tie type="start"/>'), plain)
+        self.assertNotEqual(fingerprint('<notations><tuplet type="start"/></notations>'), plain)
+
+FAKE_ATTRIBUTES = """
+<attributes>
+  <divisions>2</divisions>
+  <key><fifths>0</fifths></key>
+  <time><beats>4</beats><beat-type>4</beat-type></time>
+</attributes>
+"""
+
+def makeFakeMeasure(number, *content):
+    """ a <measure> holding content, e.g. FAKE_ATTRIBUTES and makeFakeNote() notes """
+    return '<measure number="%d">%s</measure>' % (number, ''.join(content))
+
+def makeFakeMeasures(count):
+    """ count measures without notes, the first holding FAKE_ATTRIBUTES """
+    return [makeFakeMeasure(i + 1, FAKE_ATTRIBUTES if i == 0 else '') for i in range(count)]
+
+def makeFakeScore(measures=None, doctype='', title=None):
+    """ return the bytes of a score with one part, P1, of measures, a list
+    of <measure> elements; by default makeFakeMeasures(1) """
+    if measures is None:
+        measures = makeFakeMeasures(1)
+    work = '<work><work-title>%s</work-title></work>' % title if title is not None else ''
+    return ("""<?xml version="1.0"?>%s
+    <score-partwise>%s
+      <part-list><score-part id="P1"><part-name>P</part-name><part-abbreviation>P</part-abbreviation></score-part></part-list>
+      <part id="P1">%s</part>
+    </score-partwise>""" % (doctype, work, ''.join(measures))).encode()
+
 FAKE_MEASURES = [
     """
     <measure number="1" width="319.79">
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+from reader import MusicXMLReader
+from writer import Jianpu99Writer
+from byguitar_writer import ByguitarWriter
+from score import *
+
+SCORE_FILES = ['tests/case1.musicxml', 'tests/case2.musicxml', 'tests/case3.mxl',
+               'tests/case4.mxl', 'tests/case5.musicxml']
+
+def renderAll(reader):
+    outputs = [Jianpu99Writer().generate(reader), ByguitarWriter('120').generate_jcx(reader)]
+    outputs += [ByguitarWriter(0).generate(reader, i) for i in range(len(reader.getPartIdList()))]
+    return outputs
+
+class TestScore(TestCase):
+
+    def test_roundTrip(self):
+        for filename in SCORE_FILES:
+            reader = MusicXMLReader(filename)
+            score = pickle.loads(pickle.dumps(Score.fromReader(reader)))
+            self.assertEqual(score.getWorkTitle(), reader.getWorkTitle())
+            self.assertEqual(score.getComposer(), reader.getComposer())
+            self.assertEqual(score.getPartDetailsList(), reader.getPartDetailsList())
+            self.assertEqual(score.getInitialKeySignature(), reader.getInitialKeySignature())
+            self.assertEqual(score.getInitialTimeSignature(), reader.getInitialTimeSignature())
+            self.assertEqual(renderAll(score), renderAll(reader), filename)
+
+    def test_sharedAttributes(self):
+        score = pickle.loads(pickle.dumps(Score.fromReader(MusicXMLReader('tests/case1.musicxml'))))
+        measures = list(score.iterMeasures(score.getPartIdList()[0]))
+        self.assertIs(measures[0].getAttributes(), measures[1].getAttributes())
+        self.assertIs(next(iter(measures[1])).getAttributes(), measures[1].getAttributes())
+
+    def test_soundWithoutTempo(self):
+        from test_reader import FAKE_ATTRIBUTES, makeFakeNote, makeFakeScore
+        reader = MusicXMLReader.fromBytes(makeFakeScore([
+            '<measure number="1">%s<direction><sound dynamics="80"/></direction>%s</measure>' % (
+                FAKE_ATTRIBUTES, makeFakeNote('C', 8, '1')),
+            '<measure number="2">%s<direction><sound dacapo="yes"/></direction></measure>' % (
+                makeFakeNote('D', 8, '1'))]))
+        score = Score.fromReader(reader)
+        self.assertEqual([measure.tempo for measure in score.iterMeasures('P1')], [None, None])
+        with self.assertRaises(MusicXMLParseError):
+            score.getInitialTempo()
+
+    def test_renderInSubprocess(self):
+        score = Score.fromReader(MusicXMLReader('tests/case2.musicxml'))
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            output = executor.submit(Jianpu99Writer().generate, score).result()
+        self.assertEqual(output, Jianpu99Writer().generate(score))
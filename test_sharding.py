@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import pickle
+from reader import MusicXMLReader
+from writer import Jianpu99Writer
+from byguitar_writer import ByguitarWriter
+from sharding import *
+from test_reader import makeFakeMeasure, makeFakeScore
+
+def makeKeyChangeScore(measure_count=9):
+    """ one part whose key changes in measure 4 and divisions in measure 6 """
+    measures = []
+    for i in range(measure_count):
+        attributes = ''
+        if i == 0:
+            attributes = ('<attributes><divisions>1</divisions><key><fifths>0</fifths></key>'
+                          '<time><beats>2</beats><beat-type>4</beat-type></time></attributes>')
+        elif i == 3:
+            attributes = '<attributes><key><fifths>2</fifths></key></attributes>'
+        elif i == 5:
+            attributes = '<attributes><divisions>2</divisions></attributes>'
+        duration = 2 if i >= 5 else 1
+        notes = ('<note><pitch><step>D</step><octave>4</octave></pitch><duration>%d</duration></note>' % duration) * 2
+        measures.append(makeFakeMeasure(i + 1, attributes, notes))
+    return makeFakeScore(measures)
+
+class TestSharding(TestCase):
+
+    def test_boundaryAttributes(self):
+        reader = MusicXMLReader.fromBytes(makeKeyChangeScore())
+        boundaries = reader.getBoundaryAttributes('P1', [0, 4, 8, 20])
+        self.assertIsNone(boundaries[0])
+        self.assertEqual(boundaries[4].getKeySignature(), 'D')
+        self.assertEqual(boundaries[4].getDivisions(), 1)
+        self.assertEqual(boundaries[8].getDivisions(), 2)
+        self.assertEqual(boundaries[20].getKeySignature(), 'D')
+        restored = pickle.loads(pickle.dumps(boundaries[8]))
+        self.assertEqual((restored.getKeySignature(), restored.getDivisions()), ('D', 2))
+
+    def test_identicalToSerial(self):
+        data = makeKeyChangeScore()
+        reader = MusicXMLReader.fromBytes(data)
+        for lines_per_shard in (1, 2, 5):
+            self.assertEqual(generateBodySharded(data, Jianpu99Writer(), 2, lines_per_shard=lines_per_shard),
+                             Jianpu99Writer().generateBody(reader, 2))
+
+    def test_identicalToSerialFile(self):
+        filename = 'tests/case1.musicxml'
+        reader = MusicXMLReader(filename)
+        self.assertEqual(generateBodySharded(filename, Jianpu99Writer(), 5, lines_per_shard=1),
+                         Jianpu99Writer().generate(reader))
+        staff_parts = ByguitarWriter(0).getStaffParts(reader)
+        for part_index in (0, 1):
+            self.assertEqual(generateBodySharded(reader, ByguitarWriter(0), 2, part_index, False, staff_parts,
+                                                 lines_per_shard=1),
+                             ByguitarWriter(0).generate(reader, part_index))
+
+    def test_measureSlice(self):
+        reader = MusicXMLReader.fromBytes(makeKeyChangeScore())
+        prev_attributes = reader.getBoundaryAttributes('P1', [4])[4]
+        data = reader.getMeasureSlice(4, 8)
+        sliced = MusicXMLReader.fromBytes(data)
+        self.assertEqual(sliced.getPartIdList(), ['P1'])
+        self.assertEqual(sliced.getMeasureCount('P1'), 4)
+        self.assertEqual(Jianpu99Writer().generateMeasures(list(sliced.iterMeasures('P1', prev_attributes=prev_attributes))),
+                         Jianpu99Writer().generateMeasures(list(reader.iterMeasures('P1', 4, 8, prev_attributes))))
+
+    def test_workersParseTheirSlice(self):
+        # what the workers parse together is about one score, however many shards there are
+        data = makeKeyChangeScore(60)
+        reader = MusicXMLReader.fromBytes(data)
+        shards = planShards(reader, 2, 1)
+        slices = [reader.getMeasureSlice(first * 2, stop * 2) for (first, stop), prev_attributes in shards]
+        self.assertEqual(len(slices), 30)
+        self.assertLess(sum(len(shard_data) for shard_data in slices), 1.5 * len(data))
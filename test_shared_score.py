@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import pickle
+from reader import MusicXMLReader
+from byguitar_writer import ByguitarWriter
+from shared_score import *
+from test_score import SCORE_FILES, renderAll
+
+class TestSharedScore(TestCase):
+
+    def test_render(self):
+        for filename in SCORE_FILES:
+            reader = MusicXMLReader(filename)
+            with SharedScore.fromReader(reader) as score:
+                self.assertEqual(score.getPartDetailsList(), reader.getPartDetailsList())
+                self.assertEqual(renderAll(score), renderAll(reader), filename)
+
+    def test_pickleDescriptorOnly(self):
+        reader = MusicXMLReader('tests/case3.mxl')
+        with SharedScore.fromReader(reader) as score:
+            data = pickle.dumps(score)
+            self.assertLess(len(data), len(pickle.dumps(Score.fromReader(reader))))
+            self.assertIs(pickle.loads(data), score) # attachments are reused in a process
+
+    def test_zeroCopyNotes(self):
+        with SharedScore.fromReader(MusicXMLReader('tests/case1.musicxml')) as score:
+            note = next(iter(score.getFirstMeasure(score.getPartIdList()[0])))
+            self.assertIsInstance(note, SharedNote)
+            self.assertIs(note._columns.views['note_flags'].obj, score._shm.buf.obj)
+
+    def test_generatePartsShared(self):
+        reader = MusicXMLReader('tests/case1.musicxml')
+        self.assertEqual(generatePartsShared(reader, ByguitarWriter(0), workers=2),
+                         [ByguitarWriter(0).generate(reader, i) for i in range(len(reader.getPartIdList()))])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import io
+import os
+import shutil
+import tempfile
+from reader import MusicXMLReader, MusicXMLParseError
+from writer import Jianpu99Writer, WriterError
+from byguitar_writer import ByguitarWriter
+from songbook import *
+
+class TestSongbook(TestCase):
+
+    FILES = ['tests/case1.musicxml', 'tests/case3.mxl', 'tests/case5.musicxml']
+
+    def test_jcx(self):
+        stream = io.StringIO()
+        self.assertEqual(writeSongbook(self.FILES, 'jcx', '90', stream, workers=1), [])
+        writer = ByguitarWriter('90')
+        expected = '\n\n'.join('X: %d\n' % number + writer.generate_jcx(MusicXMLReader(filename)).rstrip('\n')
+                               for number, filename in enumerate(self.FILES, 1)) + '\n'
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_jianpu99(self):
+        stream = io.StringIO()
+        writeSongbook(self.FILES, 'jianpu99', '90', stream, workers=1)
+        writer = Jianpu99Writer()
+        expected = '\n\n'.join((writer.generateHeader(MusicXMLReader(filename)) +
+                                writer.generate(MusicXMLReader(filename))).rstrip('\n')
+                               for filename in self.FILES) + '\n'
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_parallelOrdered(self):
+        serial = io.StringIO()
+        writeSongbook(self.FILES * 3, 'jcx', '90', serial, workers=1)
+        parallel = io.StringIO()
+        writeSongbook(self.FILES * 3, 'jcx', '90', parallel, workers=2)
+        self.assertEqual(parallel.getvalue(), serial.getvalue())
+
+    def test_failedSongLeftOut(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        bad_file = os.path.join(directory, 'bad.musicxml')
+        with open(bad_file, 'w') as f:
+            f.write('<score-partwise')
+
+        stream = io.StringIO()
+        failed = writeSongbook([self.FILES[0], bad_file, self.FILES[1]], 'jianpu99', '90', stream, workers=1)
+        self.assertEqual([input_file for input_file, e in failed], [bad_file])
+        self.assertIsInstance(failed[0][1], MusicXMLParseError)
+        self.assertEqual(stream.getvalue().count('V: 1.0'), 2)
+
+    def test_unsupportedMode(self):
+        with self.assertRaises(WriterError):
+            writeSongbook(self.FILES, 'byguitar', '90', io.StringIO())
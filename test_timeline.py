@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from fractions import Fraction
+from reader import MusicXMLReader
+from score import Score
+from timeline import *
+from test_reader import FAKE_ATTRIBUTES, makeFakeNote, makeFakeScore
+
+class TestFormatDuration(TestCase):
+
+    def test_matchesFraction(self):
+        for divisions in range(1, 25):
+            for duration in range(0, 100):
+                self.assertEqual(formatDuration(duration, divisions), str(Fraction(duration, divisions)))
+
+class TestPartTimeline(TestCase):
+
+    def setUp(self):
+        self.reader = MusicXMLReader.fromBytes(makeFakeScore([
+            '<measure number="1">%s%s%s</measure>' % (
+                FAKE_ATTRIBUTES, makeFakeNote('C', 4, '1'), makeFakeNote('D', 4, '1')),
+            '<measure number="2"><attributes><divisions>3</divisions></attributes>%s%s%s</measure>' % (
+                makeFakeNote('E', 6, '1'), '<backup><duration>6</duration></backup>', makeFakeNote('G', 3, '2'))]))
+
+    def test_ticks(self):
+        self.assertEqual(self.reader.getPartDivisions('P1'), {2, 3})
+        timeline = PartTimeline(self.reader, 'P1')
+        self.assertEqual(timeline.ticks_per_quarter, 6)
+        self.assertEqual([(timed.note.getPitch()[0], timed.measure_index, timed.onset, timed.duration)
+                          for timed in timeline.getNotes()],
+                         [('C', 0, 0, 12), ('D', 0, 12, 12), ('E', 1, 24, 12), ('G', 1, 24, 6)])
+        self.assertEqual(timeline.getMeasureStarts(), [0, 24, 36])
+        self.assertEqual(timeline.getLength(), 36)
+
+    def test_missingDuration(self):
+        # a note without <duration> lasts what Note.getDuration says, in onsets too
+        reader = MusicXMLReader.fromBytes(makeFakeScore([
+            '<measure number="1">%s%s%s</measure>' % (
+                FAKE_ATTRIBUTES, '<note><pitch><step>C</step><octave>4</octave></pitch><voice>1</voice></note>',
+                makeFakeNote('D', 2, '1'))]))
+        timeline = PartTimeline(reader, 'P1')
+        self.assertEqual([(timed.onset, timed.duration) for timed in timeline.getNotes()], [(0, 4), (4, 2)])
+        self.assertEqual(timeline.getLength(), 6)
+
+    def test_score(self):
+        timeline = PartTimeline(self.reader, 'P1')
+        score_timeline = PartTimeline(Score.fromReader(self.reader), 'P1')
+        self.assertEqual(score_timeline.ticks_per_quarter, timeline.ticks_per_quarter)
+        self.assertEqual([(timed.onset, timed.duration) for timed in score_timeline.getNotes()],
+                         [(timed.onset, timed.duration) for timed in timeline.getNotes()])
+        self.assertEqual(score_timeline.getMeasureStarts(), timeline.getMeasureStarts())
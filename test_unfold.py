@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+from lxml import etree
+from reader import Measure
+from unfold import *
+
+class FakeMeasure:
+
+    def __init__(self, number, **navigation):
+        self.number = number
+        self.navigation = dict({'forward': False, 'backward': False, 'times': 2,
+                                'ending': None, 'ending_stop': False}, **navigation)
+
+    def getNavigation(self):
+        return self.navigation
+
+def numbers(measures):
+    return [m.number for m in unfoldMeasures(measures)]
+
+class TestUnfold(TestCase):
+
+    def test_noRepeats(self):
+        self.assertEqual(numbers([FakeMeasure(1), FakeMeasure(2)]), [1, 2])
+
+    def test_simpleRepeat(self):
+        measures = [FakeMeasure(1), FakeMeasure(2, forward=True), FakeMeasure(3, backward=True), FakeMeasure(4)]
+        self.assertEqual(numbers(measures), [1, 2, 3, 2, 3, 4])
+        # without a forward repeat, repeat from the beginning
+        measures = [FakeMeasure(1), FakeMeasure(2, backward=True, times=3), FakeMeasure(3)]
+        self.assertEqual(numbers(measures), [1, 2, 1, 2, 1, 2, 3])
+
+    def test_references(self):
+        measures = [FakeMeasure(1, backward=True)]
+        unfolded = unfoldMeasures(measures)
+        self.assertIs(unfolded[0], unfolded[1])
+
+    def test_endings(self):
+        measures = [FakeMeasure(1, forward=True), FakeMeasure(2),
+                    FakeMeasure(3, ending=frozenset([1]), ending_stop=True, backward=True),
+                    FakeMeasure(4, ending=frozenset([2])), FakeMeasure(5, ending_stop=True),
+                    FakeMeasure(6)]
+        self.assertEqual(numbers(measures), [1, 2, 3, 1, 2, 4, 5, 6])
+
+    def test_consecutiveEndingGroups(self):
+        def groups(forward):
+            return [FakeMeasure(1, forward=True),
+                    FakeMeasure(2, ending=frozenset([1]), ending_stop=True, backward=True),
+                    FakeMeasure(3, ending=frozenset([2]), ending_stop=True),
+                    FakeMeasure(4, forward=forward),
+                    FakeMeasure(5, ending=frozenset([1]), ending_stop=True, backward=True),
+                    FakeMeasure(6, ending=frozenset([2]), ending_stop=True),
+                    FakeMeasure(7)]
+        self.assertEqual(numbers(groups(True)), [1, 2, 1, 3, 4, 5, 4, 6, 7])
+        # without a forward repeat, the second section repeats from after the first group
+        self.assertEqual(numbers(groups(False)), [1, 2, 1, 3, 4, 5, 4, 6, 7])
+        # a group of a single ending repeats into its section
+        measures = [FakeMeasure(1, forward=True),
+                    FakeMeasure(2, ending=frozenset([1]), ending_stop=True, backward=True), FakeMeasure(3)]
+        self.assertEqual(numbers(measures), [1, 2, 1, 3])
+
+    def test_daCapoAlFine(self):
+        measures = [FakeMeasure(1), FakeMeasure(2, fine='yes'), FakeMeasure(3, dacapo='yes')]
+        self.assertEqual(numbers(measures), [1, 2, 3, 1, 2])
+
+    def test_dalSegnoAlCoda(self):
+        measures = [FakeMeasure(1), FakeMeasure(2, segno='s'), FakeMeasure(3, tocoda='c'),
+                    FakeMeasure(4, dalsegno='s'), FakeMeasure(5, coda='c')]
+        self.assertEqual(numbers(measures), [1, 2, 3, 4, 2, 3, 5])
+
+    def test_repeatsSkippedAfterJump(self):
+        measures = [FakeMeasure(1, forward=True),
+                    FakeMeasure(2, ending=frozenset([1]), ending_stop=True, backward=True),
+                    FakeMeasure(3, ending=frozenset([2]), ending_stop=True),
+                    FakeMeasure(4, dacapo='yes')]
+        self.assertEqual(numbers(measures), [1, 2, 1, 3, 4, 1, 3, 4])
+
+    def test_navigationFromXml(self):
+        measure = Measure(etree.fromstring("""
+        <measure number="3">
+          <attributes><divisions>1</divisions><key><fifths>0</fifths></key>
+            <time><beats>4</beats><beat-type>4</beat-type></time></attributes>
+          <barline location="left"><ending number="1, 2" type="start"/></barline>
+          <direction><sound dalsegno="segno"/></direction>
+          <barline location="right"><bar-style>light-heavy</bar-style>
+            <ending number="1, 2" type="stop"/><repeat direction="backward" times="3"/></barline>
+        </measure>"""))
+        navigation = measure.getNavigation()
+        self.assertEqual(navigation['ending'], frozenset([1, 2]))
+        self.assertTrue(navigation['ending_stop'])
+        self.assertTrue(navigation['backward'])
+        self.assertFalse(navigation['forward'])
+        self.assertEqual(navigation['times'], 3)
+        self.assertEqual(navigation['dalsegno'], 'segno')
+
+    def test_unfoldedWriter(self):
+        from reader import MusicXMLReader
+        from writer import Jianpu99Writer
+        from test_reader import makeFakeMeasure, makeFakeScore
+        note = '<note><pitch><step>%s</step><octave>4</octave></pitch><duration>4</duration></note>'
+        reader = MusicXMLReader.fromBytes(makeFakeScore([
+            makeFakeMeasure(1, '<attributes><divisions>1</divisions><key><fifths>0</fifths></key>'
+                               '<time><beats>4</beats><beat-type>4</beat-type></time></attributes>',
+                            '<barline location="left"><bar-style>heavy-light</bar-style><repeat direction="forward"/></barline>',
+                            note % 'C'),
+            makeFakeMeasure(2, note % 'D',
+                            '<barline location="right"><bar-style>light-heavy</bar-style><repeat direction="backward"/></barline>')]))
+
+        self.assertEqual(Jianpu99Writer().generate(reader), "|: 1 - - - | 2 - - - :|\n")
+        writer = Jianpu99Writer(unfold=True)
+        self.assertEqual(writer.generate(reader), "1 - - - | 2 - - - | 1 - - - | 2 - - - |\n")
+        self.assertEqual((writer.measure_cache.hits, writer.measure_cache.misses), (2, 2))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from watcher import *
+
+class TestDirectoryWatcher(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.converted = []
+        self.watcher = DirectoryWatcher(self.directory, self.converted.append,
+                                        debounce=0, poll_interval=0.01, use_inotify=False)
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_skipUnchangedContent(self):
+        path = self._write('a.musicxml', 'one')
+        self.assertTrue(self.watcher.convertIfChanged(path))
+        self.assertFalse(self.watcher.convertIfChanged(path))
+        self._write('a.musicxml', 'two')
+        self.assertTrue(self.watcher.convertIfChanged(path))
+        self.assertEqual(self.converted, [path, path])
+
+    def test_pollingIgnoresOutputs(self):
+        backend = PollingBackend(self.directory, self.watcher.isInput, interval=0)
+        path = self._write('b.mxl', 'x')
+        self._write('b.txt', 'x')
+        self.assertEqual(backend.read(timeout=0), [path])
+        self.assertEqual(backend.read(timeout=0), [])
+
+    def test_run(self):
+        path = self._write('c.musicxml', 'x')
+        stop = threading.Event()
+        self.watcher._convert = lambda p: (self.converted.append(p), stop.set())
+        thread = threading.Thread(target=self.watcher.run, args=(stop,))
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.converted, [path])
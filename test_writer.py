@@ -166,3 +166,147 @@ class TestTranspose(TestCase):
         self.assertEqual(getTransposeOffsetToC('C'), 0)
         self.assertEqual(getTransposeOffsetToC('G'), 5)
         self.assertEqual(getTransposeOffsetToC('F#'), -6)
+
+class TestMeasureCache(TestCase):
+
+    def test_get(self):
+        cache = MeasureCache()
+        self.assertEqual(cache.get('a', lambda: "1 2"), "1 2")
+        self.assertEqual(cache.get('a', lambda: "changed"), "1 2")
+        self.assertEqual(cache.get('b', lambda: "3"), "3")
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertAlmostEqual(cache.getHitRate(), 1 / 3)
+
+    def test_repeatedMeasures(self):
+        from reader import MusicXMLReader
+        reader = MusicXMLReader('tests/case3.mxl')
+        writer = Jianpu99Writer()
+        output = writer.generate(reader)
+        self.assertGreater(writer.measure_cache.hits, 0)
+        self.assertEqual(writer.measure_cache.hits + writer.measure_cache.misses,
+                         reader.getMeasureCount(reader.getPartIdList()[0]))
+        # a fresh writer renders every measure and produces the same output
+        self.assertEqual(Jianpu99Writer().generate(reader), output)
+
+class TestWriteStream(TestCase):
+
+    def test_write(self):
+        import io
+        from reader import MusicXMLReader
+        from byguitar_writer import ByguitarWriter
+        reader = MusicXMLReader('tests/case1.musicxml')
+
+        stream = io.StringIO()
+        Jianpu99Writer().write(reader, stream)
+        self.assertEqual(stream.getvalue(), Jianpu99Writer().generate(reader))
+
+        stream = io.StringIO()
+        ByguitarWriter('90').write_jcx(reader, stream)
+        self.assertEqual(stream.getvalue(), ByguitarWriter('90').generate_jcx(reader))
+
+        stream = io.StringIO()
+        ByguitarWriter(0).write(reader, 1, stream)
+        self.assertEqual(stream.getvalue(), ByguitarWriter(0).generate(reader, 1))
+
+class TestTargetKey(TestCase):
+
+    def test_pitchTable(self):
+        self.assertEqual(getPitchTable(3)['C'], ('D#', 0))
+        self.assertEqual(getPitchTable(-3)['D'], ('B', -1))
+        self.assertEqual(getPitchTable(2)['Bb'], ('C', 1))
+        self.assertIs(getPitchTable(2), getPitchTable(2))
+
+    def test_transposeOffset(self):
+        writer = Jianpu99Writer()
+        self.assertEqual(writer.getTransposeOffset('G'), writer.getTransposeOffsetToC('G'))
+        # G up a whole step to A, then read A as C
+        self.assertEqual(writer.withTargetKey('A').getTransposeOffset('G'), 2 + writer.getTransposeOffsetToC('A'))
+        # G down a whole step to F
+        self.assertEqual(writer.withTargetKey('F').getTransposeOffset('G'), -2 + writer.getTransposeOffsetToC('F'))
+        with self.assertRaises(WriterError):
+            writer.withTargetKey('H')
+
+    def test_generateForKeys(self):
+        from reader import MusicXMLReader
+        from byguitar_writer import ByguitarWriter
+        reader = MusicXMLReader('tests/case4.mxl')
+        keys = ['G', 'C', 'Eb']
+
+        outputs = Jianpu99Writer().generateForKeys(reader, keys)
+        self.assertEqual(outputs['G'], Jianpu99Writer().generateHeader(reader) + Jianpu99Writer().generate(reader))
+        for key in keys:
+            writer = Jianpu99Writer(target_key=key)
+            self.assertEqual(outputs[key], writer.generateHeader(reader) + writer.generate(reader))
+        self.assertEqual(len(set(outputs.values())), len(keys)) # the D: line tells even equal bodies apart
+        self.assertIn('D: E$', outputs['Eb'])
+
+        outputs = ByguitarWriter('90').generate_jcx_for_keys(reader, keys)
+        for key in keys:
+            self.assertEqual(outputs[key], ByguitarWriter('90', target_key=key).generate_jcx(reader))
+        self.assertIn('K: Eb', outputs['Eb'])
+
+def makeFakeReader(notes):
+    """ a reader of a one-measure score holding notes """
+    from reader import MusicXMLReader
+    from test_reader import FAKE_ATTRIBUTES, makeFakeMeasure, makeFakeScore
+    return MusicXMLReader.fromBytes(makeFakeScore([makeFakeMeasure(1, FAKE_ATTRIBUTES, *notes)]))
+
+class TestSplitVoices(TestCase):
+
+    def test_splitVoices(self):
+        from byguitar_writer import ByguitarWriter
+        from test_reader import makeFakeNote
+        reader = makeFakeReader([makeFakeNote('C', 4, '1'), makeFakeNote('D', 4, '1'),
+                                 '<backup><duration>8</duration></backup>',
+                                 makeFakeNote('E', 4, '2'), makeFakeNote('F', 4, '2')])
+
+        self.assertEqual(ByguitarWriter(0).getStaffParts(reader), [('P1', None, None)])
+        writer = ByguitarWriter(0, split_voices=True)
+        self.assertEqual(writer.getStaffParts(reader), [('P1', None, '1'), ('P1', None, '2')])
+        self.assertEqual(writer.generate(reader, 0).split('\n')[0], 'C2 D2 |')
+        self.assertEqual(writer.generate(reader, 1).split('\n')[0], 'E2 F2 |')
+
+    def test_voiceInLaterMeasure(self):
+        from byguitar_writer import ByguitarWriter
+        from reader import MusicXMLReader
+        from test_reader import FAKE_ATTRIBUTES, makeFakeMeasure, makeFakeNote, makeFakeScore
+        reader = MusicXMLReader.fromBytes(makeFakeScore([
+            makeFakeMeasure(1, FAKE_ATTRIBUTES, makeFakeNote('C', 8, '1')),
+            makeFakeMeasure(2, makeFakeNote('D', 8, '1'), '<backup><duration>8</duration></backup>',
+                            makeFakeNote('G', 8, '3'))]))
+        writer = ByguitarWriter(0, split_voices=True)
+        self.assertEqual(writer.getStaffParts(reader), [('P1', None, '1'), ('P1', None, '3')])
+        self.assertIn('G4', writer.generate(reader, 1))
+
+class TestChords(TestCase):
+
+    def setUp(self):
+        from test_reader import makeFakeNote
+        chord_note = makeFakeNote('E', 4, '1', chord=True).replace('</note>', '<lyric><syllabic>single</syllabic><text>la</text></lyric></note>')
+        self.reader = makeFakeReader([makeFakeNote('C', 4, '1'), chord_note, makeFakeNote('G', 2, '1', chord=True),
+                                      makeFakeNote('D', 4, '1')])
+
+    def test_jianpu99(self):
+        self.assertEqual(Jianpu99Writer().generate(self.reader).split('\n')[0], '[135] - 2 - |')
+
+    def test_byguitar(self):
+        from byguitar_writer import ByguitarWriter
+        lines = ByguitarWriter(0).generate(self.reader, 0).split('\n')
+        self.assertEqual(lines[0], '[CEG]2 D2 |')
+        self.assertEqual(lines[1], 'W: la *')
+
+class TestTokens(TestCase):
+
+    def test_tieStopBeforeExtension(self):
+        from test_reader import makeFakeNote
+        reader = makeFakeReader([makeFakeNote('C', 6, '1').replace('</note>', '<tie type="stop"/></note>'),
+                                 makeFakeNote('D', 2, '1').replace('</note>', '<tie type="stop"/></note>')])
+        measure = reader.getFirstMeasure('P1')
+        writer = Jianpu99Writer()
+        self.assertEqual(writer.generateMeasure(measure), ('1', ' )', ' -', ' -', ' ', '2', ')'))
+        self.assertEqual(writer.generateMeasures([measure]), '1 ) - - 2) |')
+
+    def test_serializeTokens(self):
+        writer = Jianpu99Writer()
+        self.assertEqual(writer.serializeTokens([' ', ' ', '1', ' ', '|', ' ']), '1 |')
+        self.assertEqual(writer.serializeTokens([' ']), '')
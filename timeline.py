@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+from math import gcd
+
+def lcm(a, b):
+    return a * b // gcd(a, b)
+
+def getTicksPerQuarter(divisions):
+    """ the least tick resolution every value of divisions divides """
+    ticks = 1
+    for value in divisions:
+        ticks = lcm(ticks, value)
+    return ticks
+
+def formatDuration(duration, divisions):
+    """ duration/divisions quarters as a reduced fraction: '3/2', '1', '1/4' """
+    divisor = gcd(duration, divisions)
+    numerator, denominator = duration // divisor, divisions // divisor
+    return str(numerator) if denominator == 1 else "%d/%d" % (numerator, denominator)
+
+class TimedNote:
+    """ a note placed on the integer tick timeline of its part """
+
+    __slots__ = ('measure_index', 'onset', 'duration', 'note')
+
+    def __init__(self, measure_index, onset, duration, note):
+        self.measure_index = measure_index
+        self.onset = onset # ticks from the start of the part
+        self.duration = duration # ticks; 0 for grace notes
+        self.note = note
+
+    def getEnd(self):
+        return self.onset + self.duration
+
+class PartTimeline:
+    """ integer tick positions of the notes of one part.
+
+    Ticks per quarter is the LCM of every <divisions> used in the part, so
+    durations and onsets from measures with different divisions are plain
+    integers on one scale, with no Fraction per note. Works on a
+    MusicXMLReader or a Score.
+    """
+
+    def __init__(self, reader, partId):
+        self._reader = reader
+        self.part_id = partId
+        self.ticks_per_quarter = getTicksPerQuarter(reader.getPartDivisions(partId))
+        self._notes = None
+        self._measure_starts = None
+
+    def toTicks(self, duration, divisions):
+        return duration * (self.ticks_per_quarter // divisions)
+
+    def getNoteTicks(self, note):
+        """ the sounding length of note in ticks """
+        if note.isGrace():
+            return 0
+        return self.toTicks(*note.getDuration())
+
+    def _build(self):
+        notes = []
+        measure_starts = []
+        start = 0
+        for index, measure in enumerate(self._reader.iterMeasures(self.part_id)):
+            measure_starts.append(start)
+            factor = self.ticks_per_quarter // measure.getAttributes().getDivisions()
+            length = 0
+            for stream in measure.getVoiceStreams().values():
+                for onset, note in stream:
+                    duration = self.getNoteTicks(note)
+                    notes.append(TimedNote(index, start + onset * factor, duration, note))
+                    length = max(length, onset * factor + duration)
+            start += length
+        notes.sort(key=lambda timed: timed.onset) # stable: voices keep their order at equal onsets
+        measure_starts.append(start)
+        self._notes = notes
+        self._measure_starts = measure_starts
+
+    def getNotes(self):
+        """ return every note as a TimedNote, ordered by onset """
+        if self._notes is None:
+            self._build()
+        return self._notes
+
+    def getMeasureStarts(self):
+        """ return the tick where each measure starts, followed by the end of
+        the part; a measure lasts until the last of its notes ends """
+        if self._measure_starts is None:
+            self._build()
+        return self._measure_starts
+
+    def getLength(self):
+        return self.getMeasureStarts()[-1]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+from reader import MusicXMLParseError
+
+def _findMark(navigations, mark, value):
+    for i, navigation in enumerate(navigations):
+        if navigation.get(mark) == value:
+            return i
+    raise MusicXMLParseError("%s target not found: %s" % (mark, value))
+
+def _endingBlockEnd(navigations, i):
+    """ index of the last measure of the ending starting at i """
+    while i < len(navigations) - 1 and not navigations[i]['ending_stop']:
+        i += 1
+    return i
+
+def unfoldMeasures(measures):
+    """ return measures in playback order, as references into the given list.
+
+    Repeats are played `times` times (twice by default) taking the ending
+    whose number matches the pass. D.C. and D.S. jump once; after a jump
+    repeats are not taken again, only the last ending of a group is played,
+    playback stops at Fine and jumps from To Coda to the coda.
+    """
+    navigations = [m.getNavigation() for m in measures]
+    unfolded = []
+    passes = {} # index of a backward repeat -> times it has been played
+    repeat_start = 0
+    current_pass = 1
+    group_end = None # last measure of the ending group being played
+    jumped = False
+
+    i = 0
+    limit = 16 * len(measures) + 16 # guards against contradictory markup
+    while i < len(measures):
+        if len(unfolded) > limit:
+            raise MusicXMLParseError("repeat structure does not terminate")
+        navigation = navigations[i]
+        if navigation['forward'] and not jumped and repeat_start != i: # a new section, not a repeat of this one
+            repeat_start = i
+            current_pass = 1
+
+        if navigation['ending'] is not None:
+            end = _endingBlockEnd(navigations, i)
+            last = end + 1 >= len(measures) or navigations[end + 1]['ending'] is None
+            if last:
+                group_end = end
+            if jumped: # only the last ending of a group is played after a jump
+                play = last
+            else:
+                play = current_pass in navigation['ending']
+            if not play:
+                i = end + 1
+                continue
+
+        unfolded.append(measures[i])
+
+        if jumped and 'fine' in navigation:
+            break
+        if jumped and 'tocoda' in navigation:
+            i = _findMark(navigations, 'coda', navigation['tocoda'])
+            continue
+
+        if navigation['backward'] and not jumped:
+            played = passes.get(i, 1)
+            if played < navigation['times']:
+                passes[i] = played + 1
+                current_pass = played + 1
+                i = repeat_start
+                continue
+            passes[i] = 1
+            current_pass = 1
+            repeat_start = i + 1
+
+        if i == group_end: # a new repeat section starts after an ending group
+            group_end = None
+            current_pass = 1
+            repeat_start = i + 1
+
+        if not jumped and 'dacapo' in navigation:
+            jumped = True
+            i = 0
+            continue
+        if not jumped and 'dalsegno' in navigation:
+            jumped = True
+            i = _findMark(navigations, 'segno', navigation['dalsegno'])
+            continue
+
+        i += 1
+
+    return unfolded
+
+class UnfoldedReader:
+    """ a view of a reader whose parts are iterated in playback order.
+
+    Measures are the reader's own objects; a measure played twice appears
+    twice by reference, so writers with a measure cache render it once.
+    Everything else is delegated to the wrapped reader.
+    """
+
+    def __init__(self, reader):
+        self._reader = reader
+        self._unfolded = {}
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+    def getUnfoldedMeasures(self, partId):
+        if partId not in self._unfolded:
+            self._unfolded[partId] = unfoldMeasures(list(self._reader.iterMeasures(partId)))
+        return self._unfolded[partId]
+
+    def getMeasureCount(self, partId):
+        return len(self.getUnfoldedMeasures(partId))
+
+    def iterMeasures(self, partId, start=0, stop=None, prev_attributes=None):
+        return iter(self.getUnfoldedMeasures(partId)[start:stop])
+
+    def iterMeasureWindows(self, partId, size, release=False, start=0, stop=None, prev_attributes=None):
+        # measures are revisited, so they are never released
+        measures = self.getUnfoldedMeasures(partId)[start:stop]
+        for i in range(0, len(measures), size):
+            yield measures[i:i + size]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+import threading
+import time
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+INPUT_EXTENSIONS = ('.musicxml', '.xml', '.mxl')
+
+def hashFile(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class PollingBackend:
+    """ detect changes by comparing (mtime, size) snapshots of the directory """
+
+    def __init__(self, directory, is_input, interval=1.0):
+        self._directory = directory
+        self._is_input = is_input
+        self._interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if entry.is_file() and self._is_input(entry.name):
+                    st = entry.stat()
+                    snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def read(self, timeout):
+        time.sleep(min(timeout, self._interval))
+        snapshot = self._scan()
+        changed = [path for path, stat in snapshot.items() if self._snapshot.get(path) != stat]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyBackend:
+
+    def __init__(self, directory, is_input):
+        self._directory = directory
+        self._is_input = is_input
+        self._inotify = INotify()
+        self._inotify.add_watch(directory, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+
+    def read(self, timeout):
+        events = self._inotify.read(timeout=int(timeout * 1000))
+        return [os.path.join(self._directory, e.name) for e in events if self._is_input(e.name)]
+
+    def close(self):
+        self._inotify.close()
+
+class DirectoryWatcher:
+    """ convert MusicXML files dropped into a directory.
+
+    A file is converted once it has not changed for `debounce` seconds, and
+    only if its content hash differs from the last converted version.
+    `convert` is called with the file path on one of `workers` threads.
+    """
+
+    def __init__(self, directory, convert, debounce=1.0, workers=2,
+                 extensions=INPUT_EXTENSIONS, poll_interval=1.0, use_inotify=True):
+        self._directory = directory
+        self._convert = convert
+        self._debounce = debounce
+        self._workers = workers
+        self._extensions = extensions
+        self._poll_interval = poll_interval
+        self._use_inotify = use_inotify and INotify is not None
+
+        self._lock = threading.Lock()
+        self._pending = {} # path -> time of last change
+        self._in_flight = set()
+        self._hashes = {} # path -> content hash of last conversion
+
+    def isInput(self, name):
+        return name.lower().endswith(self._extensions)
+
+    def _createBackend(self):
+        if self._use_inotify:
+            return InotifyBackend(self._directory, self.isInput)
+        return PollingBackend(self._directory, self.isInput, self._poll_interval)
+
+    def _markPending(self, paths):
+        now = time.monotonic()
+        with self._lock:
+            for path in paths:
+                self._pending[path] = now
+
+    def _takeReady(self):
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, changed in list(self._pending.items()):
+                if now - changed >= self._debounce and path not in self._in_flight:
+                    del self._pending[path]
+                    self._in_flight.add(path)
+                    ready.append(path)
+        return ready
+
+    def convertIfChanged(self, path):
+        """ convert path unless its content is unchanged; return True if converted """
+        try:
+            digest = hashFile(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if self._hashes.get(path) == digest:
+                logger.debug("%s: unchanged, skipped", path)
+                return False
+
+        start = time.monotonic()
+        try:
+            self._convert(path)
+        except Exception as e:
+            logger.error("%s: conversion failed: %s: %s", path, type(e).__name__, e)
+            return False
+        logger.info("%s: converted in %.3fs", path, time.monotonic() - start)
+
+        with self._lock:
+            self._hashes[path] = digest
+        return True
+
+    def _runConversion(self, path):
+        try:
+            self.convertIfChanged(path)
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+
+    def run(self, stop_event=None):
+        """ watch until stop_event is set; existing files are converted on start """
+        stop_event = stop_event or threading.Event()
+        backend = self._createBackend()
+        self._markPending(os.path.join(self._directory, name)
+                          for name in os.listdir(self._directory) if self.isInput(name))
+        logger.info("watching %s (%s)", self._directory, "inotify" if self._use_inotify else "polling")
+        try:
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                while not stop_event.is_set():
+                    self._markPending(backend.read(timeout=min(self._debounce, self._poll_interval) or 0.1))
+                    for path in self._takeReady():
+                        executor.submit(self._runConversion, path)
+        finally:
+            backend.close()
@@ -1,13 +1,123 @@
 #!/usr/bin/env python
 
-from fractions import Fraction
+import copy
+import hashlib
+import inspect
+import threading
 from reader import Measure
+from unfold import UnfoldedReader
 
 class WriterError(Exception):
     pass
 
+class MeasureCache:
+    """ memo of rendered measures keyed by Measure.getFingerprint().
+
+    Safe to share between writers on several threads; measures are rendered
+    outside the lock, so two threads missing the same key may both render it.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+        result = render()
+        with self._lock:
+            self.misses += 1
+            return self._entries.setdefault(key, result)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def getHitRate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+_PITCH_TABLES = {}
+
+def getPitchTable(offset):
+    """ return {note_name: (transposed note_name, octave shift)} for a transposition
+    of offset semitones; tables are built once per offset """
+    table = _PITCH_TABLES.get(offset)
+    if table is None:
+        table = {}
+        for note_name, degree in Jianpu99Writer.NOTE_DEGREE_TABLE.items():
+            transposed_degree = degree + offset
+            table[note_name] = (Jianpu99Writer.DEGREE_NOTE_TABLE[transposed_degree % 12],
+                                transposed_degree // 12)
+        _PITCH_TABLES[offset] = table
+    return table
+
+_SOURCE_DIGESTS = {}
+
+def getSourceDigest(*objects):
+    """ return a hash of the source files defining objects, classes or
+    functions. A class also brings in its base classes and the objects in
+    the RENDER_DEPENDENCIES of each of them, for code it calls from other
+    modules. Digests are computed once per combination of objects """
+    digest = _SOURCE_DIGESTS.get(objects)
+    if digest is None:
+        filenames = set()
+        pending = list(objects)
+        seen = set()
+        while pending:
+            obj = pending.pop()
+            if obj in seen:
+                continue
+            seen.add(obj)
+            for base in getattr(obj, '__mro__', (obj,)):
+                pending.extend(vars(base).get('RENDER_DEPENDENCIES', ()))
+                try:
+                    filenames.add(inspect.getsourcefile(base))
+                except TypeError: # built in, e.g. object
+                    pass
+        source_hash = hashlib.sha1()
+        for filename in sorted(filename for filename in filenames if filename):
+            with open(filename, 'rb') as f:
+                source_hash.update(f.read())
+        digest = _SOURCE_DIGESTS[objects] = source_hash.hexdigest()[:16]
+    return digest
+
 class Jianpu99Writer:
 
+    RENDER_VERSION = 1 # part of the measure cache key, with the source digest of the writer and measure classes
+
+    def __init__(self, measure_cache=None, target_key=None, unfold=False):
+        self.measure_cache = measure_cache if measure_cache is not None else MeasureCache()
+        self.target_key = self.checkKey(target_key) # None renders in the key of the score
+        self.unfold = unfold # render repeats and jumps in playback order
+
+    def checkKey(self, key):
+        if key is not None and key not in self.NOTE_DEGREE_TABLE:
+            raise WriterError("unsupported key: %s" % key)
+        return key
+
+    def withTargetKey(self, target_key):
+        """ return a copy of this writer rendering in target_key, sharing its measure cache """
+        writer = copy.copy(self)
+        writer.target_key = self.checkKey(target_key)
+        return writer
+
     STEP_TO_NUMBER = {
         'C': '1',
         'D': '2',
@@ -27,20 +137,34 @@ class Jianpu99Writer:
         else:
             return "," * (4 - octave)
 
-    def generateTimeSuffix(self, duration, divisions):
-        note_length = Fraction(duration, divisions)
+    EXTENSION = " -" # one more quarter
+
+    def emitTimeSuffix(self, duration, divisions, tokens):
+        """ append the duration marks of a note to tokens; return the position
+        of the first extension token, or None """
         if duration < divisions: # less than quarter notes: add / and continue
-            return self.generateTimeSuffix(duration*2, divisions) + "/"
+            extension = self.emitTimeSuffix(duration*2, divisions, tokens)
+            tokens.append("/")
+            return extension
         elif duration == divisions: # quarter notes
-            return ""
+            return None
         elif duration * 2 == divisions * 3: # syncopated notes
-            return "."
+            tokens.append(".")
+            return None
         else: # sustained more than 1.5 quarter notes: add - and continue
-            return " -" + self.generateTimeSuffix(duration - divisions, divisions)
+            tokens.append(self.EXTENSION)
+            extension = len(tokens) - 1
+            self.emitTimeSuffix(duration - divisions, divisions, tokens)
+            return extension
+
+    def generateTimeSuffix(self, duration, divisions):
+        tokens = []
+        self.emitTimeSuffix(duration, divisions, tokens)
+        return ''.join(tokens)
 
     def generateHeader(self, reader):
         title = reader.getWorkTitle()
-        key = reader.getInitialKeySignature().replace('b', '$') # flat is represented by '$' in this format
+        key = (self.target_key or reader.getInitialKeySignature()).replace('b', '$') # flat is represented by '$' in this format
         time = reader.getInitialTimeSignature()
 
         header = "V: 1.0\n" # jianpu99 version number
@@ -92,49 +216,109 @@ class Jianpu99Writer:
         else:
             return 12 - degree
 
-    def generateBasicNote(self, note):
-        (duration, divisions) = self.getNoteDisplayedDuration(note)
-        time_suffix = self.generateTimeSuffix(duration, divisions)
+    def getTransposeOffset(self, keysig):
+        """ semitones to move a note in keysig so that the target key reads as C """
+        if self.target_key is None:
+            return self.getTransposeOffsetToC(keysig)
+        # move to the nearest target tonic, then down to C
+        interval = (self.NOTE_DEGREE_TABLE[self.target_key] - self.NOTE_DEGREE_TABLE[keysig]) % 12
+        if interval > 6:
+            interval -= 12
+        return interval + self.getTransposeOffsetToC(self.target_key)
+
+    def getRenderedPitch(self, note):
+        """ return (note_name, octave) of a note transposed for rendering """
+        (note_name, octave) = note.getPitch()
+        offset = self.getTransposeOffset(note.getAttributes().getKeySignature())
+        if offset == 0:
+            return (note_name, octave)
+        note_name, octave_shift = getPitchTable(offset)[note_name]
+        return (note_name, octave + octave_shift)
+
+    REST = "0"
+    FLAT = "$" # $ is used to notated flat in this format
+    TUPLET_START = "(y"
+    TUPLET_STOP = ")"
+    TIE_START = "("
+    TIE_STOP = ")"
+    TIE_STOP_BEFORE_EXTENSION = " )" # ending ties go before the first -
+
+    def emitPitch(self, note, tokens):
+        (note_name, octave) = self.getRenderedPitch(note)
+
+        tokens.append(self.stepToNumber(note_name[0:1])) # C, D, E, F, G, A, B
+        accidental = note_name[1:2] # sharp (#) and flat (b)
+        if accidental:
+            tokens.append(self.FLAT if accidental == 'b' else accidental)
+        octave_mark = self.generateOctaveMark(octave)
+        if octave_mark:
+            tokens.append(octave_mark)
+
+    def emitBasicNote(self, note, tokens):
+        """ append a note without tie and tuplet marks; return the position of
+        its first extension token, or None """
         if note.isRest():
-            return "0" + time_suffix
+            tokens.append(self.REST)
         else:
-            pitch = note.getPitch()
-            (note_name, octave) = note.getPitch()
-
-            keysig = note.getAttributes().getKeySignature()
-            if keysig != 'C':
-                offset = self.getTransposeOffsetToC(keysig)
-                (note_name, octave) = self.getTransposedPitch(note_name, octave, offset)
-
-            step = note_name[0:1] # C, D, E, F, G, A, B
-            accidental = note_name[1:2] # sharp (#) and flat (b)
-            if accidental == 'b':
-                accidental = '$' # $ is used to notated flat in this format
-
-            return self.stepToNumber(step) + accidental + self.generateOctaveMark(octave) + time_suffix
-
-    def generateNote(self, note):
-        result = self.generateBasicNote(note)
-        if note.isTieStart():
-            result = "(" + result
+            self.emitPitch(note, tokens)
+        (duration, divisions) = self.getNoteDisplayedDuration(note)
+        return self.emitTimeSuffix(duration, divisions, tokens)
+
+    def emitBasicChord(self, notes, tokens):
+        """ stacked notation of a slice; the duration is taken from its root note """
+        tokens.append("[")
+        for note in notes:
+            if not note.isRest():
+                self.emitPitch(note, tokens)
+        tokens.append("]")
+        (duration, divisions) = self.getNoteDisplayedDuration(notes[0])
+        return self.emitTimeSuffix(duration, divisions, tokens)
+
+    def emitSlice(self, notes, tokens):
+        """ append a note, or the chord of a slice, with the tie and tuplet
+        marks of its root note """
+        note = notes[0]
         if note.isTupletStart():
-            result = "(y" + result
-        if note.isTupletStop():
-            result = result + ")"
+            tokens.append(self.TUPLET_START)
+        if note.isTieStart():
+            tokens.append(self.TIE_START)
+        if len(notes) == 1:
+            extension = self.emitBasicNote(note, tokens)
+        else:
+            extension = self.emitBasicChord(notes, tokens)
+        if note.isTupletStop() and self.TUPLET_STOP:
+            tokens.append(self.TUPLET_STOP)
         if note.isTieStop():
-            if '-' in result: # put ending tie before the first -
-                idx = result.index('-')
-                result = result[:idx] + ") " + result[idx:]
+            if extension is None:
+                tokens.append(self.TIE_STOP)
             else:
-                result = result + ")"
-        return result
+                tokens.insert(extension, self.TIE_STOP_BEFORE_EXTENSION)
+
+    def generateNote(self, note):
+        tokens = []
+        self.emitSlice([note], tokens)
+        return ''.join(tokens)
+
+    def renderMeasure(self, measure):
+        """ return the tokens of a measure's notes, separated by spaces """
+        tokens = []
+        for i, notes in enumerate(measure.getSlices()):
+            if i:
+                tokens.append(self.SEPARATOR)
+            self.emitSlice(notes, tokens)
+        return tuple(tokens)
 
     def generateMeasure(self, measure):
-        pieces = [self.generateNote(note) for note in measure]
-        return ' '.join(pieces)
+        """ return the tokens of a measure; measures with the same fingerprint are
+        rendered once. The key holds a digest of the sources of the writer and
+        measure classes and their RENDER_DEPENDENCIES, so a cache never hands
+        out measures rendered by other code """
+        key = (type(self).__name__, self.RENDER_VERSION, getSourceDigest(type(self), type(measure)),
+               self.target_key, measure.getFingerprint())
+        return self.measure_cache.get(key, lambda: self.renderMeasure(measure))
 
     def generateRightBarline(self, measure):
-        if measure.getRightBarlineType() == Measure.BARLINE_REPEAT:
+        if measure.getRightBarlineType() == Measure.BARLINE_REPEAT and not self.unfold:
             return ":|"
         elif measure.getRightBarlineType() == Measure.BARLINE_DOUBLE:
             return "||/"
@@ -143,50 +327,98 @@ class Jianpu99Writer:
         else:
             return "|"
 
-    def generateMeasures(self, measureList):
-        pieces = []
+    SEPARATOR = " "
+
+    def emitMeasures(self, measureList, tokens):
         for i, measure in enumerate(measureList):
-            if measure.getLeftBarlineType() == Measure.BARLINE_REPEAT:
+            if measure.getLeftBarlineType() == Measure.BARLINE_REPEAT and not self.unfold:
                 if i == 0:
-                    pieces.append("|:")
+                    tokens.append("|:")
                 else:
-                    pieces.append(":")
-
-            pieces.append(" ")
-            pieces.append(self.generateMeasure(measure))
-            pieces.append(" ")
-            pieces.append(self.generateRightBarline(measure))
-
-        return ''.join(pieces).strip()
-
-    def generateBody(self, reader, max_measures_per_line=4):
+                    tokens.append(":")
+
+            tokens.append(self.SEPARATOR)
+            tokens.extend(self.generateMeasure(measure))
+            tokens.append(self.SEPARATOR)
+            tokens.append(self.generateRightBarline(measure))
+
+    def serializeTokens(self, tokens):
+        """ join the tokens of a line, dropping separators at both ends """
+        start, stop = 0, len(tokens)
+        while start < stop and tokens[start] == self.SEPARATOR:
+            start += 1
+        while stop > start and tokens[stop - 1] == self.SEPARATOR:
+            stop -= 1
+        return ''.join(tokens[start:stop])
 
+    def generateMeasures(self, measureList):
+        tokens = []
+        self.emitMeasures(measureList, tokens)
+        return self.serializeTokens(tokens)
+
+    def iterLineChunks(self, reader, max_measures_per_line=4, release=False, line_range=None, prev_attributes=None):
+        """ yield, for each output line, a list with the measures of every part.
+        line_range=(first, stop) limits the lines; prev_attributes then maps
+        each part id to the attributes in effect before the first line """
+        if self.unfold:
+            reader = UnfoldedReader(reader)
         parts = reader.getPartIdList()
+        measure_count = max(reader.getMeasureCount(part) for part in parts)
 
-        part_measures = dict()
-        for part in parts:
-            part_measures[part] = list(reader.iterMeasures(part))
+        start, stop = 0, measure_count
+        if line_range is not None:
+            start = line_range[0] * max_measures_per_line
+            stop = min(line_range[1] * max_measures_per_line, measure_count)
+        prev_attributes = prev_attributes or {}
+        windows = [reader.iterMeasureWindows(part, max_measures_per_line, release,
+                                             start, stop, prev_attributes.get(part))
+                   for part in parts]
 
-        # split staff
-        for k, measures in part_measures:
-            staffs = measures[0].getStaffs()
-            print(staffs)
+        for i in range(start, stop, max_measures_per_line):
+            yield [next(part_windows, []) for part_windows in windows]
 
+    def generateChunkLines(self, chunk):
         lines = []
-
-        measure_count = max(len(measures) for measures in part_measures.values())
-        for i in range(0, measure_count, max_measures_per_line):
-            begin = i
-            end = min(i + max_measures_per_line, measure_count)
-            for part_index, part in enumerate(parts):
-                line = "Q%d: " % (part_index + 1)
-                line = ''
-                line += self.generateMeasures(part_measures[part][begin:end])
-                lines.append(line)
-            lines.append('') # empty line
-
-        return '\n'.join(lines)
-
-    def generate(self, reader):
-        return self.generateBody(reader, 5)
+        for part_index, measures in enumerate(chunk):
+            line = "Q%d: " % (part_index + 1)
+            line = ''
+            line += self.generateMeasures(measures)
+            lines.append(line)
+        lines.append('') # empty line
+        return lines
+
+    def iterBodyLines(self, reader, max_measures_per_line=4, release=False):
+        """ yield body lines while holding only one line of measures per part """
+        for chunk in self.iterLineChunks(reader, max_measures_per_line, release):
+            yield from self.generateChunkLines(chunk)
+
+    def generateBody(self, reader, max_measures_per_line=4, release=False):
+        return '\n'.join(self.iterBodyLines(reader, max_measures_per_line, release))
+
+    def generate(self, reader, release=False):
+        return self.generateBody(reader, 5, release)
+
+    def generateForKeys(self, reader, keys):
+        """ return {key: generateHeader(reader) + generate(reader) rendered in
+        key}, walking the measures once. Numbers are read relative to the key,
+        so between keys only the D: line of the header and the octave marks
+        of the body change """
+        writers = [self.withTargetKey(key) for key in keys]
+        outputs = [[] for key in keys]
+        for chunk in self.iterLineChunks(reader, 5):
+            for writer, lines in zip(writers, outputs):
+                lines.extend(writer.generateChunkLines(chunk))
+        return {key: writer.generateHeader(reader) + '\n'.join(lines)
+                for key, writer, lines in zip(keys, writers, outputs)}
+
+    def writeLines(self, lines, stream):
+        """ write lines to a text stream, newline separated without a trailing newline """
+        for i, line in enumerate(lines):
+            if i:
+                stream.write('\n')
+            stream.write(line)
+
+    def write(self, reader, stream, release=False):
+        """ write the output of generate() to a text stream line by line """
+        self.writeLines(self.iterBodyLines(reader, 5, release), stream)
 